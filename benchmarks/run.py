@@ -0,0 +1,179 @@
+"""Time and memory of the public functions and exports, on synthetic data.
+
+Usage:
+    python -m benchmarks.run                       # every benchmark, at scale 1
+    python -m benchmarks.run --scale 1 10 100 --repeat 3
+    python -m benchmarks.run --only crs --output bench.csv
+
+Each benchmark runs from cold caches, unless marked as warm, in which case it runs
+once before being measured. Time is the best of the repeats. Memory is measured in
+two separate runs: the peak resident memory of the run above the memory at its
+start (which includes the Arrow memory pool used by the feather and parquet readers
+and writers), and the peak of Python allocations traced by `tracemalloc`.
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+from benchmarks.stand_ins import reset_caches, stand_ins
+from scripts import profiling
+from scripts.dac_data import bilateral_oda, multilateral
+from scripts.dac_data.oda import get_oda_data
+from scripts.dac_data.tools import get_crs_data
+from scripts.debt import data as debt
+from scripts.drm import data as drm
+from scripts.groups import IMF_EMDE
+from scripts.iso_codes import name_to_iso3
+from scripts.logger import logger
+
+
+def _crs_gross_disbursements() -> pd.DataFrame:
+    return get_crs_data(
+        donors=None,
+        start_year=2015,
+        end_year=2022,
+        oda_only=True,
+        base_year=[None, 2015],
+        exclude_china=False,
+        exclude_idrc=False,
+        exclude_students=False,
+        exclude_awareness=False,
+        include_modality=False,
+    )
+
+
+# name -> (function, warm)
+BENCHMARKS: dict[str, tuple[Callable, bool]] = {
+    "get_crs_data": (_crs_gross_disbursements, False),
+    "get_crs_data (stored aggregates)": (_crs_gross_disbursements, True),
+    "bilateral_crs_versions": (
+        lambda: bilateral_oda.bilateral_crs_versions(oda_only=True),
+        False,
+    ),
+    "get_oda_data (gross_disbursements)": (
+        lambda: get_oda_data("gross_disbursements", donors=None),
+        False,
+    ),
+    "export_oecd_gross_disbursements_versions": (
+        bilateral_oda.export_oecd_gross_disbursements_versions,
+        False,
+    ),
+    "export_all_donors_gross_disbursements": (
+        bilateral_oda.export_all_donors_gross_disbursements,
+        False,
+    ),
+    "export_bilateral_commitments_versions": (
+        bilateral_oda.export_bilateral_commitments_versions,
+        False,
+    ),
+    "export_oof_bilateral_versions": (
+        bilateral_oda.export_oof_bilateral_versions,
+        False,
+    ),
+    "export_mdb_non_concessional": (multilateral.export_mdb_non_concessional, False),
+    "get_debt_oecd": (lambda: debt.get_debt_oecd("debt_service"), False),
+    "export_oecd_versions (debt_service)": (
+        lambda: debt.export_oecd_versions("debt_service"),
+        False,
+    ),
+    "export_bilateral (non-concessional)": (debt.export_bilateral, False),
+    "get_drm": (
+        lambda: drm.get_drm(
+            "GGR_NGDP", 2015, 2028, by_country=True, base_year=[None, 2015]
+        ),
+        False,
+    ),
+    "export_drm_oecd_versions": (drm.export_drm_oecd_versions, False),
+    "export_drm_data": (drm.export_drm_data, False),
+    "name_to_iso3": (lambda: name_to_iso3(pd.Series(IMF_EMDE * 1_000)), False),
+}
+
+
+def _rss_peak_mb(func: Callable) -> float | None:
+    """Highest resident memory during a run, above the memory at its start, as
+    recorded by `profiling.stage`"""
+    with profiling.stage("benchmark"):
+        func()
+
+    record = profiling.records()[-1]
+    if record["peak_rss_mb"] is None:
+        return None
+
+    return record["peak_rss_mb"] - record["rss_before_mb"]
+
+
+def measure(func: Callable, warm: bool, repeat: int) -> dict[str, float]:
+    """Best time over the repeats, and peak resident and traced memory"""
+    times = []
+    for _ in range(repeat):
+        reset_caches()
+        if warm:
+            func()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    reset_caches()
+    if warm:
+        func()
+    rss_peak = _rss_peak_mb(func)
+
+    reset_caches()
+    if warm:
+        func()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "seconds": round(min(times), 4),
+        "rss_peak_mb": round(rss_peak, 1) if rss_peak is not None else None,
+        "traced_peak_mb": round(peak / 1024**2, 1),
+    }
+
+
+def run(scales: list[float], repeat: int = 1, only: str | None = None) -> pd.DataFrame:
+    """Run the benchmarks at each scale"""
+    results = []
+
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as root, stand_ins(Path(root), scale):
+            for name, (func, warm) in BENCHMARKS.items():
+                if only and only not in name:
+                    continue
+                results.append(
+                    {"benchmark": name, "scale": scale}
+                    | measure(func, warm=warm, repeat=repeat)
+                )
+                print(results[-1])
+
+    return pd.DataFrame(results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, nargs="+", default=[1])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--only", help="only run benchmarks containing this text")
+    parser.add_argument("--output", type=Path, help="save the results to a CSV file")
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+
+    results = run(scales=args.scale, repeat=args.repeat, only=args.only)
+    print(results.to_string(index=False))
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
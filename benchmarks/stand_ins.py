@@ -0,0 +1,127 @@
+"""Local stand-ins for the oda_data, bblocks and pydeflate readers.
+
+`stand_ins` points the project paths to a temporary folder, writes synthetic CRS
+years there as feather files (so the real CRS reader, cache and aggregates are
+exercised), and replaces the other readers with functions serving synthetic frames.
+"""
+
+import shutil
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from unittest import mock
+
+from benchmarks import synthetic
+from scripts import config, deflators, iso_codes, profiling, weo
+from scripts.dac_data import aggregates, crs, oda, tools
+from scripts.debt import ids
+from scripts.groups import emde_iso_codes
+
+CRS_YEARS: range = range(2013, 2026)
+
+OUTPUT_FOLDERS: list[str] = ["oecd", "oda", "drm", "non_concessional_lending"]
+
+
+def _debt_ids(scale: float):
+    class DebtIDS:
+        def __init__(self):
+            self._data = None
+
+        def load_data(self, indicators, start_year, end_year):
+            self._data = synthetic.ids(indicators, start_year, end_year, scale=scale)
+
+        def get_data(self):
+            return self._data.copy()
+
+        @staticmethod
+        def debt_service_indicators():
+            return {k: v for k, v in synthetic.IDS_SERIES.items() if ".TDS." in k}
+
+    return DebtIDS
+
+
+class WorldEconomicOutlook:
+    def __init__(self, year, release):
+        self._indicators = []
+
+    def load_data(self, indicator):
+        self._indicators = list(indicator)
+
+    def get_data(self, keep_metadata=False):
+        df = synthetic.weo(self._indicators)
+        if keep_metadata:
+            return df
+        return df.filter(["iso_code", "indicator", "year", "value"])
+
+
+class ODAData:
+    def __init__(self, years, donors, prices, base_year):
+        self._years, self._donors = years, donors or [1]
+        self._indicator = None
+
+    def load_indicator(self, indicator):
+        self._indicator = indicator
+
+    def get_data(self):
+        return synthetic.oda_indicator(self._indicator, self._years, self._donors)
+
+
+def convert_id(series, from_type, to_type, not_found=None, **kwargs):
+    return synthetic.iso3(series)
+
+
+def deflate(df, base_year, id_column, date_column, source_column, target_column, **_):
+    """Deflate with a 2% yearly inflation for every entity"""
+    factor = 1 + 0.02 * (base_year - df[date_column])
+    return df.assign(**{target_column: df[source_column] / factor})
+
+
+def reset_caches() -> None:
+    """Empty every in-process and on-disk cache, for a cold run"""
+    crs.clear_crs_cache()
+    shutil.rmtree(aggregates.CRS_AGGREGATES_PATH, ignore_errors=True)
+    shutil.rmtree(ids.IDS_CACHE_PATH, ignore_errors=True)
+    iso_codes.ISO3_LOOKUP_PATH.unlink(missing_ok=True)
+    iso_codes._LOOKUP = None
+    deflators._TABLES.clear()
+    weo.load_weo.cache_clear()
+    ids.debt_service_categories.cache_clear()
+    emde_iso_codes.cache_clear()
+    profiling.reset()
+
+
+@contextmanager
+def stand_ins(root: Path, scale: float = 1):
+    """Run the project against synthetic data at the given scale, under `root`"""
+    raw_data, output = root / "raw_data", root / "output"
+    raw_data.mkdir(parents=True, exist_ok=True)
+    for folder in OUTPUT_FOLDERS:
+        (output / folder).mkdir(parents=True, exist_ok=True)
+
+    for year in CRS_YEARS:
+        synthetic.crs_year(year, scale=scale).to_feather(
+            raw_data / f"crs_{year}_raw.feather"
+        )
+
+    with ExitStack() as stack:
+        patches = [
+            (config.Paths, "raw_data", raw_data),
+            (config.Paths, "output", output),
+            (aggregates, "CRS_AGGREGATES_PATH", raw_data / "crs_aggregates"),
+            (ids, "IDS_RAW_PATH", raw_data / "ids_data"),
+            (ids, "IDS_CACHE_PATH", raw_data / "ids_cache"),
+            (iso_codes, "ISO3_LOOKUP_PATH", raw_data / "iso3_lookup.json"),
+            (profiling, "PROFILING_PATH", output / "profiling"),
+            (ids, "DebtIDS", _debt_ids(scale)),
+            (weo, "WorldEconomicOutlook", WorldEconomicOutlook),
+            (oda, "ODAData", ODAData),
+            (oda, "read_dac2a", lambda years: synthetic.dac2a(years, scale=scale)),
+            (tools, "read_dac1", lambda years: synthetic.dac1(years, scale=scale)),
+            (iso_codes, "convert_id", convert_id),
+            (deflators, "deflate", deflate),
+        ]
+        for target, attribute, value in patches:
+            stack.enter_context(mock.patch.object(target, attribute, value))
+
+        reset_caches()
+        yield
+        reset_caches()
@@ -0,0 +1,206 @@
+"""Synthetic source frames with the shape of the CRS, DAC1, DAC2A, IDS and WEO data.
+
+Sizes are set by a scale factor: at scale 1, each CRS year has `CRS_ROWS_PER_YEAR`
+rows and the other sources have roughly the number of rows of their real
+counterparts for the countries and indicators used by the project.
+"""
+
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from scripts import config
+from scripts.groups import CHINA_DAC_CODE, IMF_EMDE
+
+CRS_ROWS_PER_YEAR: int = 25_000
+
+MODALITIES: list[str] = [
+    "A01",
+    "A02",
+    "B01",
+    "B03",
+    "C01",
+    "D01",
+    "D02",
+    "E01",
+    "E02",
+    "F01",
+    "G01",
+    "H01",
+    "H02",
+    "H03",
+    "H04",
+    "H05",
+    "H06",
+]
+FLOW_CODES: list[int] = [11, 13, 14, 19, 30]
+
+# Non-EMDE countries and creditors, so that group filters have something to drop
+OTHER_COUNTRIES: list[str] = ["France", "Germany", "Japan", "United States"]
+CREDITORS: list[str] = [
+    "World",
+    "China",
+    "France",
+    "Japan",
+    "IDA",
+    "IBRD",
+    "Asian Development Bank",
+    "Arab Monetary Fund",
+]
+
+IDS_SERIES: dict[str, str] = {
+    "DT.DIS.BLAT.CD": "PPG, bilateral (DIS, current US$)",
+    "DT.DIS.BLTC.CD": "PPG, bilateral concessional (DIS, current US$)",
+    "DT.DIS.MLAT.CD": "PPG, multilateral (DIS, current US$)",
+    "DT.DIS.MLTC.CD": "PPG, multilateral concessional (DIS, current US$)",
+    "DT.TDS.BLAT.CD": "Bilateral debt service (PPG, current US$)",
+    "DT.TDS.MLAT.CD": "Multilateral debt service (PPG, current US$)",
+    "DT.TDS.PBND.CD": "Bonds debt service (PPG, current US$)",
+    "DT.TDS.PCBK.CD": "Commercial banks debt service (PPG, current US$)",
+}
+
+
+def iso3(names: pd.Series) -> pd.Series:
+    """Deterministic ISO3-like codes for country names"""
+    return names.str.replace(r"[^A-Za-z]", "", regex=True).str[:3].str.upper()
+
+
+def _rng(seed: int) -> np.random.Generator:
+    return np.random.default_rng(seed)
+
+
+def crs_year(year: int, scale: float = 1, seed: int = 0) -> pd.DataFrame:
+    """A CRS year, with the cleaned column names used by oda_data"""
+    rng = _rng(seed + year)
+    rows = int(CRS_ROWS_PER_YEAR * scale)
+
+    donors = np.array(list(config.BILATERAL) + list(config.MDBs))
+    recipients = np.array(list(config.DEV_COUNTRIES) + [CHINA_DAC_CODE])
+
+    df = pd.DataFrame(
+        {
+            "year": year,
+            "donor_code": rng.choice(donors, rows),
+            "recipient_code": rng.choice(recipients, rows),
+            "flow_code": rng.choice(FLOW_CODES, rows),
+            "modality": rng.choice(MODALITIES, rows),
+            "usd_commitment": rng.lognormal(0, 2, rows),
+            "usd_disbursement": rng.lognormal(0, 2, rows),
+        }
+    )
+
+    return df.assign(
+        donor_name=lambda d: "Donor " + d.donor_code.astype(str),
+        recipient_name=lambda d: "Recipient " + d.recipient_code.astype(str),
+    )
+
+
+def dac1(years: range, scale: float = 1, seed: int = 0) -> pd.DataFrame:
+    """DAC1 with multilateral commitments (aid type 2000, flow 1150)"""
+    rng = _rng(seed)
+    donors = list(config.BILATERAL) + list(config.MDBs)
+
+    df = pd.MultiIndex.from_product(
+        [
+            list(years),
+            donors,
+            [1010, 2000, 1500] * max(1, int(scale)),
+            [1140, 1150],
+            ["A", "D"],
+        ],
+        names=["year", "donor_code", "aidtype_code", "flows_code", "amounttype_code"],
+    ).to_frame(index=False)
+
+    return df.assign(
+        donor_name=lambda d: "Donor " + d.donor_code.astype(str),
+        value=rng.lognormal(3, 1, len(df)),
+    )
+
+
+def dac2a(years: range, scale: float = 1, seed: int = 0) -> pd.DataFrame:
+    """DAC2A with the developing countries total and China as recipients"""
+    rng = _rng(seed)
+    recipients = [10100, CHINA_DAC_CODE] + list(config.DEV_COUNTRIES)[: int(50 * scale)]
+
+    df = pd.MultiIndex.from_product(
+        [list(years), [20001, 20002, 20006, 1, 2], recipients, [240, 106], ["A", "D"]],
+        names=[
+            "year",
+            "donor_code",
+            "recipient_code",
+            "aidtype_code",
+            "data_type_code",
+        ],
+    ).to_frame(index=False)
+
+    return df.assign(
+        donor_name=lambda d: "Donor " + d.donor_code.astype(str),
+        recipient_name=lambda d: "Recipient " + d.recipient_code.astype(str),
+        value=rng.lognormal(5, 1, len(df)),
+    )
+
+
+def oda_indicator(
+    indicator: str, years: range, donors: list, seed: int = 0
+) -> pd.DataFrame:
+    """An indicator as returned by ODAData.get_data"""
+    rng = _rng(seed)
+
+    df = pd.MultiIndex.from_product(
+        [list(years), list(donors)], names=["year", "donor_code"]
+    ).to_frame(index=False)
+
+    return df.assign(
+        indicator=indicator,
+        currency="USD",
+        prices="constant",
+        value=rng.lognormal(2, 1, len(df)),
+    )
+
+
+def ids(
+    indicators: list[str], start_year: int, end_year: int, scale: float = 1, seed=0
+) -> pd.DataFrame:
+    """IDS indicators by debtor and creditor, as returned by DebtIDS.get_data"""
+    rng = _rng(seed)
+    countries = (IMF_EMDE + OTHER_COUNTRIES) * max(1, int(scale))
+    creditors = CREDITORS + [f"Creditor {i}" for i in range(int(20 * scale))]
+
+    df = pd.MultiIndex.from_product(
+        [range(start_year, end_year + 1), countries, creditors, indicators],
+        names=["year", "country", "counterpart_area", "series_code"],
+    ).to_frame(index=False)
+
+    return df.assign(
+        year=lambda d: pd.to_datetime(d.year, format="%Y"),
+        series=lambda d: d.series_code.map(IDS_SERIES),
+        value=rng.lognormal(15, 2, len(df)),
+    )
+
+
+def _weo_indicator(indicator: str, seed: int) -> pd.DataFrame:
+    """A WEO indicator, with values that only depend on the indicator and seed"""
+    rng = _rng(seed + zlib.crc32(indicator.encode()))
+
+    df = pd.MultiIndex.from_product(
+        [IMF_EMDE + OTHER_COUNTRIES, range(1980, 2030)], names=["name", "year"]
+    ).to_frame(index=False)
+
+    return df.assign(indicator=indicator, value=rng.lognormal(3, 1, len(df)))
+
+
+def weo(indicators: list[str], seed: int = 0) -> pd.DataFrame:
+    """WEO indicators with their metadata, as returned by WorldEconomicOutlook"""
+    df = pd.concat(
+        [_weo_indicator(indicator, seed) for indicator in indicators],
+        ignore_index=True,
+    )
+
+    return df.assign(
+        iso_code=lambda d: iso3(d.name),
+        entity_name=lambda d: d.name,
+        indicator_name=lambda d: "Indicator " + d.indicator,
+        estimate=lambda d: d.year > 2023,
+        year=lambda d: pd.to_datetime(d.year, format="%Y"),
+    )
@@ -21,6 +21,14 @@ EXCLUDE_AWARENESS = True
 
 DRM_INDICATOR: str = "revenue"
 
+# Aggregate the CRS one record batch at a time, instead of reading whole years into
+# the in-process cache. Peak memory is then about one batch of the CRS.
+CRS_STREAMING: bool = False
+CRS_BATCH_ROWS: int = 500_000
+
+WEO_YEAR: int = 2024
+WEO_RELEASE: int = 1
+
 BILATERAL = donor_groupings()["all_bilateral"]
 
 DEV_COUNTRIES = {
@@ -0,0 +1,354 @@
+"""Grouped CRS values in current prices, stored on disk with one file per year.
+
+Grouping the CRS is the expensive part of every CRS based export. The current-price
+aggregates for a query (grouping columns, flow type and predicates) are stored as
+one parquet file per year, with a fingerprint of the raw data the year was computed
+from: the hash of its file when the CRS is stored by year, or the hash of the
+metadata of its row groups when the CRS is a single file. A refresh only recomputes the years which are new or
+whose raw data changed. Constant-price outputs are rebuilt by deflating the stored
+aggregates, so a deflator revision never needs the CRS to be read again.
+
+Most queries only differ by donors, flows, excluded modalities and recipients, and
+by how the result is grouped. They are answered by slicing the CRS cube: the CRS
+aggregated by year, donor, recipient, flow and modality, with commitments and
+disbursements, stored like any other aggregate.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from scripts import config
+from scripts.dac_data.crs import (
+    Predicate,
+    crs_year_file,
+    full_crs_file,
+    full_crs_names,
+    iter_crs_year,
+    apply_filters,
+    normalise_filters,
+    read_crs_cached,
+)
+from scripts.logger import logger
+from scripts.profiling import stage
+from scripts.schema import concat, to_categorical
+
+CRS_AGGREGATES_PATH: Path = config.Paths.raw_data / "crs_aggregates"
+
+CUBE_GROUPER: list[str] = [
+    "year",
+    "donor_code",
+    "donor_name",
+    "recipient_code",
+    "recipient_name",
+    "flow_code",
+    "modality",
+]
+CUBE_MEASURES: list[str] = ["usd_commitment", "usd_disbursement"]
+
+# (path, size, modification time) -> content hash. Hashes are also stored under
+# CRS_AGGREGATES_PATH, so that a file is only hashed again when it changes.
+_FINGERPRINTS: dict[tuple[str, int, int], str] = {}
+
+# (path, size, modification time) -> row groups of the full CRS, by year
+_ROW_GROUPS: dict[tuple[str, int, int], list[tuple[int | None, int | None, str]]] = {}
+
+
+def _file_hashes_path() -> Path:
+    return CRS_AGGREGATES_PATH / "file_hashes.json"
+
+
+def _read_file_hashes() -> dict[str, list]:
+    """Stored [size, modification time, hash] of the hashed files, by path"""
+    if not _file_hashes_path().exists():
+        return {}
+    with open(_file_hashes_path(), "r") as f:
+        return json.load(f)
+
+
+def _write_file_hashes(hashes: dict[str, list]) -> None:
+    _file_hashes_path().parent.mkdir(parents=True, exist_ok=True)
+    temp = _file_hashes_path().with_suffix(".tmp")
+    with open(temp, "w") as f:
+        json.dump(dict(sorted(hashes.items())), f, indent=4)
+    temp.replace(_file_hashes_path())
+
+
+def _file_hash(path: Path) -> str:
+    """Content hash of a file, only computed again when its size or modification
+    time change"""
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+
+    if key not in _FINGERPRINTS:
+        hashes = _read_file_hashes()
+        stored = hashes.get(str(path))
+
+        if stored is not None and stored[:2] == [stat.st_size, stat.st_mtime_ns]:
+            _FINGERPRINTS[key] = stored[2]
+        else:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024**2), b""):
+                    digest.update(chunk)
+            _FINGERPRINTS[key] = digest.hexdigest()
+
+            hashes[str(path)] = [stat.st_size, stat.st_mtime_ns, _FINGERPRINTS[key]]
+            _write_file_hashes(hashes)
+
+    return _FINGERPRINTS[key]
+
+
+def _row_group_description(row_group) -> str:
+    """Number of rows, and sizes and statistics of every column chunk, of a row
+    group of the full CRS"""
+    columns = []
+    for i in range(row_group.num_columns):
+        chunk = row_group.column(i)
+        statistics = chunk.statistics
+        columns.append(
+            [
+                chunk.path_in_schema,
+                chunk.total_compressed_size,
+                chunk.total_uncompressed_size,
+                statistics.to_dict() if statistics is not None else None,
+            ]
+        )
+
+    return json.dumps([row_group.num_rows, columns], default=str)
+
+
+def _full_crs_row_groups() -> list[tuple[int | None, int | None, str]]:
+    """(first year, last year, description) of each row group of the full CRS.
+
+    Only the parquet footer is read. The years are None when the row group has no
+    statistics for the year column.
+    """
+    path = full_crs_file()
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+
+    if key not in _ROW_GROUPS:
+        metadata = pq.ParquetFile(path).metadata
+        year_column = full_crs_names(path)["year"]
+
+        row_groups = []
+        for r in range(metadata.num_row_groups):
+            row_group = metadata.row_group(r)
+            year = next(
+                row_group.column(i).statistics
+                for i in range(row_group.num_columns)
+                if row_group.column(i).path_in_schema == year_column
+            )
+            if year is not None and year.has_min_max:
+                first, last = int(year.min), int(year.max)
+            else:
+                first, last = None, None
+            row_groups.append((first, last, _row_group_description(row_group)))
+
+        _ROW_GROUPS[key] = row_groups
+
+    return _ROW_GROUPS[key]
+
+
+def _full_crs_year_hash(year: int) -> str:
+    """Fingerprint of a year in the full CRS, from the footer metadata of the row
+    groups which may contain it.
+
+    A row group also holding other years, or without year statistics, counts for
+    every year it may contain, so a change in it marks all of them as revised.
+    Appending a year, or revising another one in its own row groups, leaves the
+    fingerprint unchanged.
+    """
+    digest = hashlib.sha256()
+    for first, last, description in _full_crs_row_groups():
+        if first is None or first <= year <= last:
+            digest.update(description.encode())
+
+    return digest.hexdigest()
+
+
+def year_fingerprint(year: int) -> str | None:
+    """Fingerprint of the raw data a CRS year is read from.
+
+    When the CRS is stored as a single file, this is a hash of the metadata of the
+    year's row groups, so refreshing the file only changes the fingerprint of the
+    years whose row groups changed. None
+    means the year is not available locally yet.
+    """
+    if full_crs_file().exists():
+        return _full_crs_year_hash(year)
+
+    if crs_year_file(year).exists():
+        return _file_hash(crs_year_file(year))
+
+    return None
+
+
+def _query_path(
+    grouper: list[str], flow_type: str | list[str], filters: tuple[Predicate, ...]
+) -> Path:
+    query = json.dumps([grouper, flow_type, filters], default=str)
+    return CRS_AGGREGATES_PATH / hashlib.sha256(query.encode()).hexdigest()[:16]
+
+
+def _read_meta(path: Path) -> dict[str, str]:
+    if not (path / "meta.json").exists():
+        return {}
+    with open(path / "meta.json", "r") as f:
+        return json.load(f)["years"]
+
+
+def _write_meta(
+    path: Path,
+    grouper: list[str],
+    flow_type: str | list[str],
+    filters,
+    years: dict[str, str],
+) -> None:
+    temp = path / "meta.tmp"
+    with open(temp, "w") as f:
+        json.dump(
+            {
+                "grouper": grouper,
+                "flow_type": flow_type,
+                "filters": filters,
+                "years": dict(sorted(years.items())),
+            },
+            f,
+            indent=4,
+            default=str,
+        )
+    temp.replace(path / "meta.json")
+
+
+def _group(df: pd.DataFrame, grouper: list[str], measures: list[str]) -> pd.DataFrame:
+    return df.groupby(grouper, as_index=False, dropna=False, observed=True)[
+        measures
+    ].sum()
+
+
+def _group_years(
+    years: list[int], grouper: list[str], measures: list[str], filters
+) -> dict[int, pd.DataFrame]:
+    """Group the years read together through the shared CRS cache"""
+    df = read_crs_cached(years=years, columns=grouper + measures, filters=filters)
+
+    with stage("group_crs") as s:
+        s.rows_in = len(df)
+        df = _group(df, grouper, measures)
+        s.rows = len(df)
+
+    return {
+        year: df.loc[lambda d: d.year == year].reset_index(drop=True) for year in years
+    }
+
+
+def _stream_year(
+    year: int, grouper: list[str], measures: list[str], filters
+) -> pd.DataFrame:
+    """Group a year one record batch at a time, merging the partial sums"""
+    columns = tuple(dict.fromkeys(["year", *grouper, *measures]))
+
+    with stage("stream_crs") as s:
+        s.rows_in = 0
+        partials = []
+        for batch in iter_crs_year(year, columns=columns, filters=filters):
+            s.rows_in += len(batch)
+            partials.append(_group(batch, grouper, measures))
+
+        # There is always one partial, typed even when empty. Empty ones are only
+        # kept if no batch matched, so they don't weigh on the merged types.
+        partials = [p for p in partials if len(p)] or partials[:1]
+
+        df = _group(concat(partials, ignore_index=True), grouper, measures)
+        s.rows = len(df)
+
+    return to_categorical(df)
+
+
+def crs_aggregates(
+    years: list[int] | range,
+    grouper: list[str],
+    flow_type: str | list[str],
+    filters: list[Predicate] | None = None,
+) -> pd.DataFrame:
+    """Get the CRS grouped by `grouper`, in current prices, for the given years.
+
+    `flow_type` is the value column to sum, or a list of value columns.
+
+    Years stored from the same raw data are read from disk. The others are read from
+    the CRS, grouped, and stored for the next run. With `config.CRS_STREAMING`, they
+    are grouped one record batch at a time instead of being read whole.
+    """
+    measures = [flow_type] if isinstance(flow_type, str) else list(flow_type)
+    filters = normalise_filters(filters)
+    path = _query_path(grouper, flow_type, filters)
+    stored = _read_meta(path)
+
+    fingerprints = {year: year_fingerprint(year) for year in years}
+    stale = [
+        year
+        for year, fingerprint in fingerprints.items()
+        if fingerprint is None or stored.get(str(year)) != fingerprint
+    ]
+
+    frames = {
+        # Years without rows store their label columns without categories
+        year: pd.read_parquet(path / f"{year}.parquet").pipe(to_categorical)
+        for year in years
+        if year not in stale
+    }
+
+    if stale:
+        logger.debug(f"CRS aggregates: computing {stale}")
+        if config.CRS_STREAMING:
+            computed = {
+                year: _stream_year(year, grouper, measures, filters) for year in stale
+            }
+        else:
+            computed = _group_years(stale, grouper, measures, filters)
+
+        path.mkdir(parents=True, exist_ok=True)
+        for year in stale:
+            frames[year] = computed[year]
+            # Years which were downloaded by this read are stored too
+            fingerprint = year_fingerprint(year)
+            if fingerprint is not None:
+                frames[year].to_parquet(path / f"{year}.parquet", index=False)
+                stored[str(year)] = fingerprint
+
+        _write_meta(path, grouper, flow_type, filters, stored)
+
+    return concat([frames[year] for year in years], ignore_index=True)
+
+
+def crs_cube(years: list[int] | range) -> pd.DataFrame:
+    """The CRS by year, donor, recipient, flow and modality, in current prices, with
+    commitments and disbursements"""
+    return crs_aggregates(years=years, grouper=CUBE_GROUPER, flow_type=CUBE_MEASURES)
+
+
+def in_cube(grouper: list[str], flow_type: str, filters: list[Predicate]) -> bool:
+    """Whether a query can be answered from the CRS cube"""
+    columns = set(grouper) | {column for column, _, _ in filters}
+    return flow_type in CUBE_MEASURES and columns <= set(CUBE_GROUPER)
+
+
+@stage("slice_cube")
+def slice_cube(
+    years: list[int] | range,
+    grouper: list[str],
+    flow_type: str,
+    filters: list[Predicate] | None = None,
+) -> pd.DataFrame:
+    """Get the CRS grouped by `grouper`, in current prices, from the CRS cube.
+
+    Gives the same result as `crs_aggregates` for queries accepted by `in_cube`.
+    """
+    df = crs_cube(years).pipe(apply_filters, normalise_filters(filters))
+
+    return _group(df, grouper, [flow_type])
@@ -1,15 +1,31 @@
+from contextlib import ExitStack
+
 import pandas as pd
-from bblocks import convert_id
 
 from scripts import config
 from scripts.dac_data.oda import get_oda_data
 from scripts.dac_data.oof import get_oof_data
-from scripts.dac_data.tools import INDICATORS, key_statistics, get_crs_data
-from scripts.tools import export_json
+from scripts.dac_data.tools import (
+    INDICATORS,
+    ExclusionProfile,
+    get_crs_data,
+    get_crs_variants,
+    key_statistics,
+)
+from scripts.deflators import price_column
+from scripts.iso_codes import name_to_iso3
+from scripts.schema import concat
+from scripts.tools import ExportSink, export_json, export_table
 
 START_YEAR: int = 2017
 END_YEAR: int = 2023
 
+# "total" keeps in-donor flows, "core" excludes them. Both exclude China.
+VERSIONS: dict[str, ExclusionProfile] = {
+    "total": ExclusionProfile(china=True, idrc=False, students=False, awareness=False),
+    "core": ExclusionProfile(china=True, idrc=True, students=True, awareness=True),
+}
+
 
 def bilateral_oda(
     indicator: str,
@@ -55,47 +71,38 @@ def bilateral_non_concessional(
     return df
 
 
-def export_bilateral_commitments_versions():
-    indicator_comm = "bilateral_commitments"
-
-    data_comm_total = bilateral_oda(
-        indicator=indicator_comm,
-        exclude_china=True,
-        exclude_idrc=False,
-        exclude_awareness=False,
-        exclude_students=False,
-    )
-    stats_comm_total = key_statistics(data_comm_total, indicator=indicator_comm)
+def bilateral_crs_versions(oda_only: bool) -> dict[str, pd.DataFrame]:
+    """Total and core versions of bilateral CRS data (ODA or non-concessional),
+    computed from a single CRS read"""
 
-    data_comm_core = bilateral_oda(
-        indicator=indicator_comm,
-        exclude_china=True,
-        exclude_idrc=True,
-        exclude_awareness=True,
-        exclude_students=True,
+    return get_crs_variants(
+        VERSIONS,
+        donors=list(config.BILATERAL),
+        start_year=START_YEAR,
+        end_year=END_YEAR,
+        oda_only=oda_only,
+        non_oda_only=not oda_only,
+        by_donor=False,
+        by_recipient=False,
     )
 
-    stats_comm_core = key_statistics(data_comm_core, indicator=indicator_comm)
 
-    data_comm_total.to_csv(
-        config.Paths.output / "total_bilateral_commitments_oda_constant_excl_China.csv",
-        index=False,
-    )
+def export_bilateral_commitments_versions():
+    indicator_comm = "bilateral_commitments"
 
-    export_json(
-        config.Paths.output / "total_key_stats_bilateral_commitments_oda.json",
-        stats_comm_total,
-    )
+    for version, data in bilateral_crs_versions(oda_only=True).items():
+        stats = key_statistics(data, indicator=indicator_comm)
 
-    data_comm_core.to_csv(
-        config.Paths.output / "core_bilateral_commitments_oda_constant_excl_China.csv",
-        index=False,
-    )
+        export_table(
+            data,
+            config.Paths.output
+            / f"{version}_bilateral_commitments_oda_constant_excl_China.csv",
+        )
 
-    export_json(
-        config.Paths.output / "core_key_stats_bilateral_commitments_oda.json",
-        stats_comm_core,
-    )
+        export_json(
+            config.Paths.output / f"{version}_key_stats_bilateral_commitments_oda.json",
+            stats,
+        )
 
 
 def export_all_donors_gross_disbursements(exclude_china: bool = True):
@@ -114,7 +121,7 @@ def export_all_donors_gross_disbursements(exclude_china: bool = True):
     idrc = bilateral_oda(indicator="idrc")
 
     in_donor = (
-        pd.concat([students, idrc], ignore_index=True)
+        concat([students, idrc], ignore_index=True)
         .groupby(["year", "prices"], as_index=False, dropna=False, observed=True)[
             "value"
         ]
@@ -123,16 +130,16 @@ def export_all_donors_gross_disbursements(exclude_china: bool = True):
 
     in_donor_stats = key_statistics(in_donor, indicator="in_donor")
 
-    gross_disbursements.to_csv(
+    export_table(
+        gross_disbursements,
         config.Paths.output
         / "oda"
         / f"total_gross_disbursements_constant_oda{suffix}.csv",
-        index=False,
     )
 
-    in_donor.to_csv(
+    export_table(
+        in_donor,
         config.Paths.output / "oda" / "in_donor_constant_oda.csv",
-        index=False,
     )
 
     export_json(
@@ -154,9 +161,9 @@ def export_multilateral():
     )
     stats_comm_total = key_statistics(data_comm_total, indicator=indicator)
 
-    data_comm_total.to_csv(
+    export_table(
+        data_comm_total,
         config.Paths.output / "core_multilateral_commitments_oda.csv",
-        index=False,
     )
 
     export_json(
@@ -166,42 +173,20 @@ def export_multilateral():
 
 
 def export_oof_bilateral_versions():
-    data_oof_total = bilateral_non_concessional(
-        exclude_china=True,
-        exclude_idrc=False,
-        exclude_awareness=False,
-        exclude_students=False,
-    )
-    stats_oof_total = key_statistics(data_oof_total, indicator="non_concessional")
-
-    data_oof_core = bilateral_non_concessional(
-        exclude_china=True,
-        exclude_idrc=True,
-        exclude_awareness=True,
-        exclude_students=True,
-    )
-    stats_oof_core = key_statistics(data_oof_core, indicator="non_concessional")
-
-    data_oof_total.to_csv(
-        config.Paths.output
-        / "total_bilateral_non_concessional_constant_excl_China.csv",
-        index=False,
-    )
+    for version, data in bilateral_crs_versions(oda_only=False).items():
+        stats = key_statistics(data, indicator="non_concessional")
 
-    export_json(
-        config.Paths.output / "total_key_stats_bilateral_non_concessional.json",
-        stats_oof_total,
-    )
-
-    data_oof_core.to_csv(
-        config.Paths.output / "core_bilateral_non_concessional_constant_excl_China.csv",
-        index=False,
-    )
+        export_table(
+            data,
+            config.Paths.output
+            / f"{version}_bilateral_non_concessional_constant_excl_China.csv",
+        )
 
-    export_json(
-        config.Paths.output / "core_key_stats_bilateral_non_concessional.json",
-        stats_oof_core,
-    )
+        export_json(
+            config.Paths.output
+            / f"{version}_key_stats_bilateral_non_concessional.json",
+            stats,
+        )
 
 
 def export_oecd_gross_disbursements(
@@ -211,29 +196,34 @@ def export_oecd_gross_disbursements(
     base_year: int | None = 2015,
     by_donor: bool = True,
 ):
-    suffix = "gross_disbursements"
-    suffix += f"_{base_year}constant" if prices == "constant" else "_current"
-    suffix += "_by_donor" if by_donor else ""
-    suffix += f"_{start_year}_{end_year}"
-
-    gross_disbursements = get_crs_data(
-        donors=None,
+    export_oecd_gross_disbursements_versions(
         start_year=start_year,
         end_year=end_year,
+        base_years=[base_year if prices == "constant" else None],
+        by_donor=by_donor,
+    )
+
+
+def _gross_disbursements_year(
+    year: int, base_years: list[int | None], by_donor: bool
+) -> pd.DataFrame:
+    """Gross disbursements of a single year, with recipient ISO codes"""
+    df = get_crs_data(
+        donors=None,
+        start_year=year,
+        end_year=year,
         oda_only=True,
-        prices=prices,
-        base_year=base_year,
+        base_year=base_years,
         exclude_china=False,
         exclude_idrc=False,
         exclude_students=False,
         exclude_awareness=False,
         include_modality=False,
+        by_donor=by_donor,
     )
 
-    gross_disbursements["recipient_iso_code"] = convert_id(
-        gross_disbursements.recipient_name,
-        from_type="regex",
-        to_type="ISO3",
+    df["recipient_iso_code"] = name_to_iso3(
+        df.recipient_name,
         not_found="",
         additional_mapping={
             "TÃ¼rkiye": "TUR",
@@ -243,49 +233,51 @@ def export_oecd_gross_disbursements(
     )
 
     if not by_donor:
-        gross_disbursements = (
-            gross_disbursements.groupby(
-                [
-                    c
-                    for c in gross_disbursements.columns
-                    if c not in ["donor_code", "donor_name", "value"]
-                ],
-                dropna=False,
-                observed=True,
-            )["value"]
-            .sum()
-            .reset_index()
-        )
+        # The published files without donors have the ISO codes before the values
+        values = [price_column("value", base_year) for base_year in base_years]
+        df = df[[c for c in df.columns if c not in values] + values]
 
-    gross_disbursements.assign(units="USD million")
+    return df
 
-    gross_disbursements = gross_disbursements.loc[
-        lambda d: (d.value != 0) & (d.value.notna())
-    ]
 
-    gross_disbursements["value"] = gross_disbursements["value"].round(6)
+def export_oecd_gross_disbursements_versions(
+    start_year: int = 2015,
+    end_year: int = 2022,
+    base_years: list[int | None] | None = None,
+    by_donor: bool = True,
+):
+    """Export gross disbursements in several price bases from a single CRS pass.
 
-    gross_disbursements.to_csv(
-        config.Paths.output / "oecd" / f"oda_{suffix}.csv",
-        index=False,
-    )
+    A base year of None stands for current prices. The data is built and written one
+    year at a time, so the full donor by recipient table is never held in memory.
+    """
+    if base_years is None:
+        base_years = [None, 2015]
+
+    value_columns = [price_column("value", base_year) for base_year in base_years]
+
+    with ExitStack() as stack:
+        sinks = {}
+        for base_year, value_column in zip(base_years, value_columns):
+            suffix = "gross_disbursements"
+            suffix += f"_{base_year}constant" if base_year is not None else "_current"
+            suffix += "_by_donor" if by_donor else ""
+            suffix += f"_{start_year}_{end_year}"
 
+            sinks[value_column] = stack.enter_context(
+                ExportSink(config.Paths.output / "oecd" / f"oda_{suffix}.csv")
+            )
 
-if __name__ == "__main__":
-    # gross disbursements
-    export_all_donors_gross_disbursements(exclude_china=True)
-    export_all_donors_gross_disbursements(exclude_china=False)
+        for year in range(start_year, end_year + 1):
+            gross_disbursements = _gross_disbursements_year(year, base_years, by_donor)
 
-    export_oecd_gross_disbursements(prices="constant", by_donor=True)
-    export_oecd_gross_disbursements(prices="current", base_year=None, by_donor=True)
-    export_oecd_gross_disbursements(prices="constant", by_donor=False)
-    export_oecd_gross_disbursements(prices="current", base_year=None, by_donor=False)
+            for value_column, sink in sinks.items():
+                df = gross_disbursements.drop(
+                    columns=[c for c in value_columns if c != value_column]
+                ).rename(columns={value_column: "value"})
 
-    # Concessional
-    # export_bilateral_commitments_versions()
+                df = df.loc[lambda d: (d.value != 0) & (d.value.notna())]
 
-    # Non-concessional
-    # export_oof_bilateral_versions()
+                df["value"] = df["value"].round(6)
 
-    # Multi
-    # export_multilateral()
+                sink.write(df)
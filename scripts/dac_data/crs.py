@@ -0,0 +1,347 @@
+"""Read CRS data with column projection and predicate pushdown, through an
+in-process cache shared by every CRS based export in a run."""
+
+from collections import OrderedDict
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from oda_data import read_crs, set_data_path
+from oda_data.clean_data.common import clean_column_name, clean_raw_df
+from oda_data.clean_data.schema import CRS_MAPPING
+
+from scripts import config
+from scripts.logger import logger
+from scripts.profiling import stage
+from scripts.schema import concat, to_categorical
+
+set_data_path(config.Paths.raw_data)
+
+CRS_CACHE_BUDGET_MB: int = 6_000
+
+# A predicate is a (column, operator, value) tuple, in the format used by pyarrow.
+# Operators can be "==", "!=", "in" and "not in". Predicates are combined with AND.
+Predicate = tuple[str, str, object]
+
+CacheKey = tuple[int, tuple[str, ...] | None, tuple[Predicate, ...]]
+
+
+def crs_year_file(year: int):
+    return config.Paths.raw_data / f"crs_{year}_raw.feather"
+
+
+def full_crs_file():
+    return config.Paths.raw_data / "fullCRS.parquet"
+
+
+def normalise_filters(filters: list[Predicate] | None) -> tuple[Predicate, ...]:
+    """Make the predicates hashable and independent of the order of their values"""
+    if not filters:
+        return ()
+
+    normalised = []
+    for column, op, value in filters:
+        if op in ("in", "not in"):
+            value = tuple(sorted(set(value), key=str))
+        normalised.append((column, op, value))
+
+    return tuple(sorted(normalised, key=str))
+
+
+def _predicate_mask(column: pd.Series, op: str, value) -> np.ndarray:
+    """Evaluate a predicate on a column. Categoricals are matched on their codes,
+    after looking the values up once in the categories."""
+    if op in ("in", "not in"):
+        values = list(value)
+    elif op in ("==", "!="):
+        values = [value]
+    else:
+        raise ValueError(f"Operator {op} is not supported")
+
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = np.flatnonzero(column.cat.categories.isin(values))
+        mask = np.isin(column.cat.codes.to_numpy(), codes)
+    else:
+        mask = column.isin(values).to_numpy()
+
+    return ~mask if op in ("not in", "!=") else mask
+
+
+@stage("filter_crs")
+def apply_filters(df: pd.DataFrame, filters: tuple[Predicate, ...]) -> pd.DataFrame:
+    """Apply the predicates to a DataFrame which is already in memory.
+
+    The predicates are combined into a single mask, so the frame is sliced once.
+    The share of rows kept by each predicate on its own is logged at DEBUG level.
+    """
+    if not filters or df.empty:
+        return df
+
+    mask = np.ones(len(df), dtype=bool)
+    for column, op, value in filters:
+        predicate = _predicate_mask(df[column], op, value)
+        logger.debug(f"filter_crs: {column} {op} keeps {predicate.mean():.1%} of rows")
+        mask &= predicate
+
+    return df.loc[mask]
+
+
+def _read_feather_year(
+    year: int, columns: tuple[str, ...] | None, filters: tuple[Predicate, ...]
+) -> pd.DataFrame:
+    """Read a single CRS year from the feather file saved by oda_data"""
+    dataset = ds.dataset(crs_year_file(year), format="feather")
+
+    table = dataset.to_table(
+        columns=list(columns) if columns is not None else None,
+        filter=pq.filters_to_expression([list(filters)]) if filters else None,
+    )
+
+    return table.to_pandas()
+
+
+def full_crs_names(path) -> dict[str, str]:
+    """Raw column names of the full CRS, by their cleaned names"""
+    names = {}
+    for raw in pq.read_schema(path).names:
+        clean = clean_column_name(raw)
+        names[CRS_MAPPING.get(clean, clean)] = raw
+
+    return names
+
+
+def _raw_query(
+    path, years: list[int], columns: tuple[str, ...] | None, filters
+) -> tuple[list[str] | None, list[Predicate]]:
+    """Translate a projection and predicates to the raw names of the full CRS"""
+    raw_names = full_crs_names(path)
+
+    raw_columns = None
+    if columns is not None:
+        raw_columns = [raw_names[c] for c in columns if c in raw_names]
+
+    raw_filters = [(raw_names["year"], "in", years)] + [
+        (raw_names[column], op, value) for column, op, value in filters
+    ]
+
+    return raw_columns, raw_filters
+
+
+def _read_full_crs(
+    years: list[int], columns: tuple[str, ...] | None, filters: tuple[Predicate, ...]
+) -> pd.DataFrame:
+    """Read the CRS years from the full CRS parquet file.
+
+    The file uses the raw CRS column names, so the projection and the predicates are
+    translated before being pushed down to the parquet reader. This means row groups
+    are skipped based on their statistics and dictionary pages.
+    """
+    path = full_crs_file()
+    raw_columns, raw_filters = _raw_query(path, years, columns, filters)
+
+    df = pd.read_parquet(
+        path, columns=raw_columns, filters=raw_filters, engine="pyarrow"
+    )
+
+    return df.pipe(clean_raw_df)
+
+
+@stage("load_crs")
+def read_crs_years(
+    years: list[int],
+    columns: tuple[str, ...] | None = None,
+    filters: tuple[Predicate, ...] = (),
+) -> pd.DataFrame:
+    """Read the CRS for the given years, keeping only the requested columns and the
+    rows which match all the predicates.
+
+    When the CRS is stored as parquet or feather, the projection and predicates are
+    pushed down to the reader so that only the data actually needed is materialised.
+    """
+    if full_crs_file().exists():
+        return _read_full_crs(years, columns, filters).pipe(to_categorical)
+
+    frames = []
+    for year in years:
+        if crs_year_file(year).exists():
+            frames.append(_read_feather_year(year, columns, filters))
+            continue
+
+        # Let oda_data download the year, then filter it in memory
+        df = read_crs(years=year).pipe(apply_filters, filters)
+        frames.append(df.filter(columns) if columns is not None else df)
+
+    return concat(frames, ignore_index=True).pipe(to_categorical)
+
+
+def _iter_batches(
+    dataset: ds.Dataset, columns: list[str] | None, filter, batch_rows: int
+) -> Iterator[pd.DataFrame]:
+    """Scan a dataset in batches, or yield an empty batch with the projected types
+    when no row matches"""
+    empty = True
+    for batch in dataset.to_batches(
+        columns=columns, filter=filter, batch_size=batch_rows
+    ):
+        empty = False
+        yield batch.to_pandas()
+
+    if empty:
+        table = dataset.schema.empty_table()
+        yield (table.select(columns) if columns is not None else table).to_pandas()
+
+
+def iter_crs_year(
+    year: int,
+    columns: tuple[str, ...] | None = None,
+    filters: tuple[Predicate, ...] = (),
+    batch_rows: int = config.CRS_BATCH_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """Read a CRS year in record batches of at most `batch_rows` rows.
+
+    The projection and predicates are pushed down as in `read_crs_years`, and only
+    one batch is in memory at a time. At least one batch is returned, empty if no
+    row matches. Years which have to be downloaded by oda_data are returned as a
+    single batch.
+    """
+    if full_crs_file().exists():
+        raw_columns, raw_filters = _raw_query(full_crs_file(), [year], columns, filters)
+        dataset = ds.dataset(full_crs_file(), format="parquet")
+        for batch in _iter_batches(
+            dataset, raw_columns, pq.filters_to_expression(raw_filters), batch_rows
+        ):
+            yield batch.pipe(clean_raw_df)
+        return
+
+    if crs_year_file(year).exists():
+        dataset = ds.dataset(crs_year_file(year), format="feather")
+        yield from _iter_batches(
+            dataset,
+            list(columns) if columns is not None else None,
+            pq.filters_to_expression([list(filters)]) if filters else None,
+            batch_rows,
+        )
+        return
+
+    df = read_crs(years=year).pipe(apply_filters, filters)
+    yield df.filter(columns) if columns is not None else df
+
+
+class CRSCache:
+    """Least recently used store of CRS frames, with one entry per year.
+
+    Entries are keyed by year, by the projected columns and by the predicates used to
+    read them. A request is served from a cached entry which has all the requested
+    columns and was read with a subset of the requested predicates. The remaining
+    predicates are applied in memory, so overlapping year windows, narrower
+    projections and stricter filters (e.g. core after total) never read the CRS
+    again.
+    """
+
+    def __init__(self, budget_mb: int = CRS_CACHE_BUDGET_MB):
+        self.budget = budget_mb * 1024**2
+        self._frames: OrderedDict[CacheKey, pd.DataFrame] = OrderedDict()
+        self._sizes: dict[CacheKey, int] = {}
+
+    @property
+    def size(self) -> int:
+        """Memory used by the cached frames, in bytes"""
+        return sum(self._sizes.values())
+
+    def _lookup(
+        self,
+        year: int,
+        columns: tuple[str, ...] | None,
+        filters: tuple[Predicate, ...],
+    ):
+        """Find a cached frame for the year which covers the requested columns and
+        predicates, preferring the one with the fewest predicates left to apply"""
+        best, best_remaining = None, None
+
+        for key in reversed(self._frames):
+            cached_year, cached_columns, cached_filters = key
+            if cached_year != year or not set(cached_filters) <= set(filters):
+                continue
+
+            remaining = tuple(p for p in filters if p not in cached_filters)
+            needed = set(columns or ()) | {column for column, _, _ in remaining}
+            if cached_columns is not None and (
+                columns is None or not needed <= set(cached_columns)
+            ):
+                continue
+
+            if best is None or len(remaining) < len(best_remaining):
+                best, best_remaining = key, remaining
+            if not remaining:
+                break
+
+        if best is None:
+            return None
+
+        self._frames.move_to_end(best)
+        df = apply_filters(self._frames[best], best_remaining)
+        return df if columns is None else df.filter(columns)
+
+    def _store(self, key: CacheKey, df: pd.DataFrame):
+        """Store a frame and evict the least recently used ones over budget"""
+        self._frames[key] = df
+        self._sizes[key] = int(df.memory_usage(deep=True).sum())
+
+        while self.size > self.budget and len(self._frames) > 1:
+            evicted, _ = self._frames.popitem(last=False)
+            logger.debug(f"CRS cache: evicted {evicted[0]}")
+            del self._sizes[evicted]
+
+    def get(
+        self,
+        years: list[int],
+        columns: list[str] | None = None,
+        filters: list[Predicate] | None = None,
+    ) -> pd.DataFrame:
+        """Get the CRS for the given years, reading only the years not cached"""
+        if columns is not None:
+            columns = tuple(dict.fromkeys(["year", *columns]))
+
+        filters = normalise_filters(filters)
+
+        frames = {}
+        for year in years:
+            cached = self._lookup(year, columns, filters)
+            if cached is not None:
+                frames[year] = cached
+
+        missing = [year for year in years if year not in frames]
+
+        if missing:
+            logger.debug(f"CRS cache: reading {missing}")
+            df = read_crs_years(years=missing, columns=columns, filters=filters)
+
+            for year in missing:
+                frames[year] = df.loc[lambda d: d.year == year].reset_index(drop=True)
+                self._store((year, columns, filters), frames[year])
+
+        return concat([frames[year] for year in years], ignore_index=True)
+
+    def clear(self) -> None:
+        """Drop every cached frame"""
+        self._frames.clear()
+        self._sizes.clear()
+
+
+_CACHE = CRSCache()
+
+
+def read_crs_cached(
+    years: list[int] | range,
+    columns: list[str] | None = None,
+    filters: list[Predicate] | None = None,
+) -> pd.DataFrame:
+    """Read the CRS for the given years through the shared in-process cache"""
+    return _CACHE.get(years=list(years), columns=columns, filters=filters)
+
+
+def clear_crs_cache() -> None:
+    """Empty the shared CRS cache"""
+    _CACHE.clear()
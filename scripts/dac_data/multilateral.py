@@ -2,7 +2,7 @@ from scripts import config
 from scripts.dac_data.oda import get_oda_data
 from scripts.dac_data.oof import get_oof_data
 from scripts.dac_data.tools import INDICATORS, key_statistics
-from scripts.tools import export_json
+from scripts.tools import export_json, export_table
 
 START_YEAR: int = 2017
 END_YEAR: int = 2023
@@ -107,44 +107,14 @@ def mdb_non_concessional(flow_type: str = "usd_commitment"):
     return df
 
 
-if __name__ == "__main__":
-
-    # Concessional
-    # indicator_disb = "bilateral_recipient_total_gross"
-    # indicator_comm = "bilateral_commitments"
-    # data_disb = mdb_oda(indicator=indicator_disb)
-    # data_comm = mdb_oda(indicator=indicator_comm)
-    # stats_disb = key_statistics(data_disb, indicator="gross_disbursements")
-    # stats_comm = key_statistics(data_comm, indicator="commitments")
-
-    # Non-concessional
+def export_mdb_non_concessional() -> None:
     data_oof = mdb_non_concessional(flow_type="usd_disbursement")
     stats_oof = key_statistics(data_oof, indicator="non_concessional")
 
-    # Save the data
-    # data_disb.to_csv(
-    #     config.Paths.output / "mdb_disbursements_concessional_constant_excl_China.csv",
-    #     index=False,
-    # )
-    #
-    # data_comm.to_csv(
-    #     config.Paths.output / "mdb_commitments_concessional_constant_excl_China.csv",
-    #     index=False,
-    # )
-
-    data_oof.to_csv(
+    export_table(
+        data_oof,
         config.Paths.output
         / "mdb_commitments_non_concessional_constant_excl_China.csv",
-        index=False,
     )
 
-    # export_json(
-    #     config.Paths.output / "mdb_stats_concessional_disbursements_oda.json",
-    #     stats_disb,
-    # )
-
-    # export_json(
-    #     config.Paths.output / "mdb_stats_concessional_commitments_oda.json", stats_comm
-    # )
-
     export_json(config.Paths.output / "mdb_stats_non_concessional.json", stats_oof)
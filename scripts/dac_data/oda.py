@@ -1,23 +1,32 @@
+from dataclasses import dataclass
+from typing import Callable
+
 import pandas as pd
 from oda_data import set_data_path, ODAData, read_dac2a, read_dac1
 from pydeflate import set_pydeflate_path
 
 from scripts import config
-from scripts.config import BILATERAL
 from scripts.dac_data.tools import (
+    ExclusionProfile,
+    exclusion_profiles,
     get_crs_data,
+    get_crs_sensitivity,
     group_donors,
     group_recipients,
     add_donor_name,
     filter_dev_countries,
     get_multilateral_commitments,
     to_constant,
+    with_exclusions,
 )
+from scripts.profiling import stage
+from scripts.schema import concat, to_categorical
 
 set_data_path(config.Paths.raw_data)
 set_pydeflate_path(config.Paths.raw_data)
 
 
+@stage("load_dac2a")
 def get_dac2a_data(
     start_year: int = 2019,
     end_year: int = 2023,
@@ -31,7 +40,7 @@ def get_dac2a_data(
     data_type_code = "A"
     recipients = [10100, 730]
 
-    oda = read_dac2a(years=range(start_year, end_year + 1))
+    oda = read_dac2a(years=range(start_year, end_year + 1)).pipe(to_categorical)
     oda = (
         oda.loc[lambda d: d.donor_code.isin(agg_donors)]
         .loc[lambda d: d.aidtype_code == aidtype]
@@ -61,6 +70,112 @@ def get_dac2a_data(
     return oda.filter(["year", "donor_code", "donor_name", "value"])
 
 
+@dataclass(frozen=True)
+class ODARequest:
+    """What `get_oda_data` asks of a provider"""
+
+    indicator: str
+    donors: list[str]
+    start_year: int
+    end_year: int
+    prices: str
+    base_year: int
+    profile: ExclusionProfile
+    by_donor: bool
+    by_recipient: bool
+
+
+def _group(df: pd.DataFrame, request: ODARequest) -> pd.DataFrame:
+    """Group the data as requested"""
+    if not request.by_donor:
+        df = group_donors(df)
+
+    if not request.by_recipient:
+        df = group_recipients(df)
+
+    return df
+
+
+def _bilateral_commitments(request: ODARequest) -> pd.DataFrame:
+    """Bilateral commitments from the CRS, aggregated directly to the breakdown"""
+    return get_crs_data(
+        donors=request.donors,
+        start_year=request.start_year,
+        end_year=request.end_year,
+        oda_only=True,
+        prices=request.prices,
+        base_year=request.base_year,
+        exclude_china=request.profile.china,
+        exclude_idrc=request.profile.idrc,
+        exclude_students=request.profile.students,
+        exclude_awareness=request.profile.awareness,
+        by_donor=request.by_donor,
+        by_recipient=request.by_recipient,
+    )
+
+
+def _multilateral_commitments(request: ODARequest) -> pd.DataFrame:
+    """Multilateral commitments from DAC1"""
+    df = get_multilateral_commitments(
+        donors=request.donors,
+        start_year=request.start_year,
+        end_year=request.end_year,
+        prices=request.prices,
+        base_year=request.base_year,
+    )
+
+    return _group(df, request)
+
+
+def _gross_disbursements(request: ODARequest) -> pd.DataFrame:
+    """Gross disbursements from DAC2A"""
+    df = get_dac2a_data(
+        start_year=request.start_year,
+        end_year=request.end_year,
+        prices=request.prices,
+        base_year=request.base_year,
+        exclude_china=request.profile.china,
+    )
+
+    return _group(df, request)
+
+
+@stage("load_oda_data")
+def _oda_data_indicator(request: ODARequest) -> pd.DataFrame:
+    """Any other indicator, loaded through ODAData"""
+    oda = ODAData(
+        years=range(request.start_year, request.end_year + 1),
+        donors=request.donors,
+        prices=request.prices,
+        base_year=request.base_year,
+    )
+    oda.load_indicator(request.indicator)
+
+    df = (
+        oda.get_data()
+        .pipe(add_donor_name)
+        .pipe(to_categorical)
+        .pipe(filter_dev_countries)
+    )
+
+    return _group(df, request)
+
+
+# Indicators with their own source. Each provider only creates the loaders it needs,
+# and any other indicator is loaded through ODAData.
+PROVIDERS: dict[str, Callable[[ODARequest], pd.DataFrame]] = {
+    "bilateral_commitments": _bilateral_commitments,
+    "multilateral_commitments": _multilateral_commitments,
+    "gross_disbursements": _gross_disbursements,
+}
+
+# The exclusions read by the providers which don't come from the CRS. Any other
+# indicator reads none of them.
+PROVIDER_EXCLUSIONS: dict[str, tuple[str, ...]] = {
+    "gross_disbursements": ("china",),
+}
+
+
 def get_oda_data(
     indicator: str,
     donors: list[str],
@@ -77,65 +192,83 @@ def get_oda_data(
 ) -> pd.DataFrame:
     """Get the total ODA for the given years"""
 
-    # Create ODA object
-    oda = ODAData(
-        years=range(start_year, end_year + 1),
+    request = ODARequest(
+        indicator=indicator,
         donors=donors,
+        start_year=start_year,
+        end_year=end_year,
         prices=prices,
         base_year=base_year,
+        profile=ExclusionProfile(
+            china=exclude_china,
+            idrc=exclude_idrc,
+            students=exclude_students,
+            awareness=exclude_awareness,
+        ),
+        by_donor=by_donor,
+        by_recipient=by_recipient,
     )
 
+    return PROVIDERS.get(indicator, _oda_data_indicator)(request)
+
+
+def get_oda_sensitivity(
+    indicator: str,
+    donors: list[str],
+    start_year: int = 2019,
+    end_year: int = 2023,
+    prices: str = "constant",
+    base_year: int = 2019,
+    by_donor: bool = False,
+    by_recipient: bool = False,
+    profiles: dict[str, ExclusionProfile] | None = None,
+) -> pd.DataFrame:
+    """Get an indicator for several exclusion profiles (by default, every
+    combination) as a single frame, with one `exclude_*` column per exclusion.
+
+    CRS indicators are grouped once for all the profiles. As with `get_oda_data`,
+    they keep the modality breakdown for the profiles which exclude no modality.
+    Other indicators are loaded once per combination of the exclusions their
+    provider reads.
+    """
+    if profiles is None:
+        profiles = exclusion_profiles()
+
     if indicator == "bilateral_commitments":
-        df = get_crs_data(
+        return get_crs_sensitivity(
             donors=donors,
             start_year=start_year,
             end_year=end_year,
             oda_only=True,
             prices=prices,
             base_year=base_year,
-            exclude_china=exclude_china,
-            exclude_idrc=exclude_idrc,
-            exclude_students=exclude_students,
-            exclude_awareness=exclude_awareness,
-        )
-    elif indicator == "multilateral_commitments":
-        df = get_multilateral_commitments(
-            donors=donors,
-            start_year=start_year,
-            end_year=end_year,
-            prices=prices,
-            base_year=base_year,
-        )
-    elif indicator == "gross_disbursements":
-        df = get_dac2a_data(
-            start_year=start_year,
-            end_year=end_year,
-            prices=prices,
-            base_year=base_year,
-            exclude_china=exclude_china,
+            include_modality=True,
+            by_donor=by_donor,
+            by_recipient=by_recipient,
+            profiles=profiles,
         )
 
-    else:
-        # Load the indicator
-        oda.load_indicator(indicator)
-        df = oda.get_data().pipe(add_donor_name).pipe(filter_dev_countries)
-
-    # Group the data as requested
-    if not by_donor:
-        df = group_donors(df)
-
-    if not by_recipient:
-        df = group_recipients(df)
-
-    return df
+    provider = PROVIDERS.get(indicator, _oda_data_indicator)
+    used = PROVIDER_EXCLUSIONS.get(indicator, ())
 
+    loaded = {}
+    frames = []
+    for profile in profiles.values():
+        key = tuple(getattr(profile, name) for name in used)
+        if key not in loaded:
+            loaded[key] = provider(
+                ODARequest(
+                    indicator=indicator,
+                    donors=donors,
+                    start_year=start_year,
+                    end_year=end_year,
+                    prices=prices,
+                    base_year=base_year,
+                    profile=profile,
+                    by_donor=by_donor,
+                    by_recipient=by_recipient,
+                )
+            )
+        frames.append(with_exclusions(loaded[key], profile))
 
-if __name__ == "__main__":
-    ...
-    # data = get_oda_data(
-    #     indicator="gross_disbursements",
-    #     start_year=2017,
-    #     end_year=2023,
-    #     donors=list(BILATERAL),
-    #     by_donor=True,
-    # )
+    return concat(frames, ignore_index=True)
@@ -5,12 +5,7 @@ from oda_data import set_data_path
 from pydeflate import set_pydeflate_path
 
 from scripts import config
-from scripts.config import BILATERAL
-from scripts.dac_data.tools import (
-    get_crs_data,
-    group_donors,
-    group_recipients,
-)
+from scripts.dac_data.tools import get_crs_data
 
 set_data_path(config.Paths.raw_data)
 set_pydeflate_path(config.Paths.raw_data)
@@ -45,22 +40,8 @@ def get_oof_data(
         exclude_idrc=exclude_idrc,
         exclude_students=exclude_students,
         exclude_awareness=exclude_awareness,
+        by_donor=by_donor,
+        by_recipient=by_recipient,
     )
 
-    # Group the data as requested
-    if not by_donor:
-        df = group_donors(df)
-
-    if not by_recipient:
-        df = group_recipients(df)
-
     return df
-
-
-if __name__ == "__main__":
-    data = get_oof_data(
-        start_year=2017,
-        end_year=2023,
-        donors=None,
-        by_donor=True,
-    )
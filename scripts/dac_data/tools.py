@@ -1,15 +1,22 @@
+import itertools
+from dataclasses import asdict, dataclass, fields
+
 import pandas as pd
-from oda_data import read_crs, donor_groupings, read_dac1
-from pydeflate import deflate
+from oda_data import donor_groupings, read_dac1
 
 from scripts.config import (
     EXCLUDE_IDRC,
     EXCLUDE_CHINA,
-    DEV_COUNTRIES,
     REFERENCE_YEAR,
     EXCLUDE_STUDENTS,
     EXCLUDE_AWARENESS,
 )
+from scripts.dac_data.aggregates import crs_aggregates, in_cube, slice_cube
+from scripts.dac_data.crs import Predicate, apply_filters
+from scripts.deflators import apply_deflator, apply_deflators, price_column
+from scripts.groups import CHINA_DAC_CODE, developing_countries, in_group
+from scripts.profiling import stage
+from scripts.schema import concat, to_categorical
 
 INDICATORS: dict[str, str] = {
     "gross_disbursements": "gross_disbursements",
@@ -36,43 +43,51 @@ REFUGEE_MODS: list[str] = ["H02", "H03", "H04", "H05", "H06"]
 STUDENT_MODS: list[str] = ["E01", "E02"]
 AWARENESS_MODS: list[str] = ["H01"]
 
+ODA_FLOWS: list[int] = [11, 13, 19]
+
+DONOR_COLUMNS: list[str] = ["donor_code", "donor_name"]
+RECIPIENT_COLUMNS: list[str] = ["recipient_code", "recipient_name"]
+
 
 def to_constant(
-    df: pd.DataFrame, base_year: int = 2019, column: str = "usd_commitment"
+    df: pd.DataFrame,
+    base_year: int | list[int | None] = 2019,
+    column: str = "usd_commitment",
 ) -> pd.DataFrame:
-    """Convert the values to constant prices"""
-    df = deflate(
-        df=df,
-        base_year=base_year,
-        deflator_source="oecd_dac",
-        deflator_method="dac_deflator",
-        exchange_source="oecd_dac",
-        source_currency="USA",
-        target_currency="USA",
-        id_column="donor_code",
-        id_type="DAC",
-        date_column="year",
-        source_column=column,
-        target_column=column,
+    """Convert the values to constant prices, using DAC deflators.
+
+    If a list of base years is passed, the column is replaced by one column per
+    price basis (see `price_column`), where None stands for current prices.
+    """
+    if isinstance(base_year, list):
+        return apply_deflators(
+            df,
+            source="dac",
+            base_years=base_year,
+            id_column="donor_code",
+            column=column,
+        )
+
+    return apply_deflator(
+        df, source="dac", base_year=base_year, id_column="donor_code", column=column
     )
 
-    return df
-
 
 def keep_oda_only(df: pd.DataFrame) -> pd.DataFrame:
     """Filter the data to only include ODA"""
-    df = df.loc[lambda d: d["flow_code"].isin([11, 13, 19])]
+    df = df.loc[lambda d: d["flow_code"].isin(ODA_FLOWS)]
 
     return df
 
 
 def keep_non_oda_only(df: pd.DataFrame) -> pd.DataFrame:
     """Filter the data to only include ODA"""
-    df = df.loc[lambda d: ~d["flow_code"].isin([11, 13, 19])]
+    df = df.loc[lambda d: ~d["flow_code"].isin(ODA_FLOWS)]
 
     return df
 
 
+@stage("load_dac1")
 def get_multilateral_commitments(
     donors: list[int | str],
     start_year: int = 2019,
@@ -88,7 +103,7 @@ def get_multilateral_commitments(
         "donor_name",
     ]
 
-    df = read_dac1(years=range(start_year, end_year + 1))
+    df = read_dac1(years=range(start_year, end_year + 1)).pipe(to_categorical)
 
     df = df.loc[lambda d: d["donor_code"].isin(donors)]
 
@@ -108,78 +123,302 @@ def get_multilateral_commitments(
     return df.rename(columns={"usd_commitment": "value"})
 
 
-def get_crs_data(
+def crs_filters(
+    donors: list[int | str] | None,
+    oda_only: bool,
+    non_oda_only: bool,
+    exclude_china: bool,
+    exclude_idrc: bool,
+    exclude_students: bool,
+    exclude_awareness: bool,
+) -> list[Predicate]:
+    """Build the predicates which are pushed down to the CRS reader"""
+
+    filters = []
+
+    if donors:
+        filters.append(("donor_code", "in", list(donors)))
+
+    if oda_only:
+        filters.append(("flow_code", "in", ODA_FLOWS))
+
+    if non_oda_only:
+        filters.append(("flow_code", "not in", ODA_FLOWS))
+
+    excluded_modalities = (
+        (REFUGEE_MODS if exclude_idrc else [])
+        + (STUDENT_MODS if exclude_students else [])
+        + (AWARENESS_MODS if exclude_awareness else [])
+    )
+
+    if excluded_modalities:
+        filters.append(("modality", "not in", excluded_modalities))
+
+    if exclude_china:
+        filters.append(("recipient_code", "not in", [CHINA_DAC_CODE]))
+
+    return filters
+
+
+@dataclass(frozen=True)
+class ExclusionProfile:
+    """Recipients and in-donor flows left out of CRS data"""
+
+    china: bool = EXCLUDE_CHINA
+    idrc: bool = EXCLUDE_IDRC
+    students: bool = EXCLUDE_STUDENTS
+    awareness: bool = EXCLUDE_AWARENESS
+
+    @property
+    def modalities(self) -> list[str]:
+        """The modalities excluded by the profile"""
+        return (
+            (REFUGEE_MODS if self.idrc else [])
+            + (STUDENT_MODS if self.students else [])
+            + (AWARENESS_MODS if self.awareness else [])
+        )
+
+
+def get_crs_variants(
+    profiles: dict[str, ExclusionProfile],
     donors: list[int | str] | None,
     start_year: int = 2019,
     end_year: int = 2023,
     oda_only: bool = True,
     non_oda_only: bool = False,
     prices: str = "constant",
-    base_year: int = 2019,
+    base_year: int | list[int | None] = 2019,
     flow_type: str = "usd_commitment",
-    exclude_china: bool = EXCLUDE_CHINA,
-    exclude_idrc: bool = EXCLUDE_IDRC,
-    exclude_students: bool = EXCLUDE_STUDENTS,
-    exclude_awareness: bool = EXCLUDE_AWARENESS,
     additional_grouper: list[str] | None = None,
     include_modality: bool = True,
-):
-    """Get the total ODA for the given years"""
+    by_donor: bool = True,
+    by_recipient: bool = True,
+) -> dict[str, pd.DataFrame]:
+    """Get CRS data for several exclusion profiles from a single read.
+
+    Exclusions shared by every profile are pushed down to the CRS reader. The others
+    are applied by masking the data grouped by modality (and by recipient, for
+    China), which is much smaller than the CRS. See `get_crs_data` for the other
+    arguments.
+    """
+
+    if oda_only and non_oda_only:
+        raise ValueError("Cannot have both oda_only and non_oda_only as True")
 
     if additional_grouper is None:
         additional_grouper = []
 
-    grouper = (
-        [
-            "year",
-            "donor_code",
-            "donor_name",
-            "recipient_code",
-            "recipient_name",
-        ]
-        + additional_grouper
-        + (["modality"] if include_modality else [])
+    shared = ExclusionProfile(
+        china=all(p.china for p in profiles.values()),
+        idrc=all(p.idrc for p in profiles.values()),
+        students=all(p.students for p in profiles.values()),
+        awareness=all(p.awareness for p in profiles.values()),
     )
 
-    df = read_crs(years=range(start_year, end_year + 1))
+    mask_china = any(p.china != shared.china for p in profiles.values())
+    mask_modality = any(p.modalities != shared.modalities for p in profiles.values())
+
+    deflate = isinstance(base_year, list) or prices == "constant"
+
+    def grouper_for(profile: ExclusionProfile | None) -> list[str]:
+        """The output grouper of a profile, or the grouper of the read if None"""
+        if profile is None:
+            keep_modality = mask_modality or any(
+                include_modality and not p.modalities for p in profiles.values()
+            )
+        else:
+            keep_modality = include_modality and not profile.modalities
+
+        return (
+            ["year"]
+            + (DONOR_COLUMNS if by_donor or (profile is None and deflate) else [])
+            + (RECIPIENT_COLUMNS if by_recipient else [])
+            + (
+                ["recipient_code"]
+                if profile is None and mask_china and not by_recipient
+                else []
+            )
+            + additional_grouper
+            + (["modality"] if keep_modality else [])
+        )
+
+    filters = crs_filters(
+        donors=donors,
+        oda_only=oda_only,
+        non_oda_only=non_oda_only,
+        exclude_china=shared.china,
+        exclude_idrc=shared.idrc,
+        exclude_students=shared.students,
+        exclude_awareness=shared.awareness,
+    )
 
-    if donors:
-        df = df.loc[lambda d: d["donor_code"].isin(donors)]
+    # Current-price aggregates, from the CRS cube when the query fits in it
+    aggregate = (
+        slice_cube if in_cube(grouper_for(None), flow_type, filters) else crs_aggregates
+    )
+    df = aggregate(
+        years=range(start_year, end_year + 1),
+        grouper=grouper_for(None),
+        flow_type=flow_type,
+        filters=filters,
+    )
 
-    if oda_only and non_oda_only:
-        raise ValueError("Cannot have both oda_only and non_oda_only as True")
+    if isinstance(base_year, list):
+        df = to_constant(df, base_year=base_year, column=flow_type).rename(
+            columns={
+                price_column(flow_type, b): price_column("value", b) for b in base_year
+            }
+        )
+        values = [price_column("value", b) for b in base_year]
+    else:
+        if prices == "constant":
+            df = to_constant(df, base_year=base_year, column=flow_type)
+        df = df.rename(columns={flow_type: "value"})
+        values = ["value"]
 
-    if oda_only:
-        df = keep_oda_only(df)
+    variants = {}
+    for name, profile in profiles.items():
+        masks = []
 
-    if non_oda_only:
-        df = keep_non_oda_only(df)
+        if mask_china and profile.china:
+            masks.append(("recipient_code", "!=", CHINA_DAC_CODE))
 
-    if exclude_idrc:
-        df = df.loc[lambda d: ~d["modality"].isin(REFUGEE_MODS)]
+        if mask_modality and profile.modalities:
+            masks.append(("modality", "not in", profile.modalities))
 
-    if exclude_students:
-        df = df.loc[lambda d: ~d["modality"].isin(STUDENT_MODS)]
+        data = apply_filters(df, masks)
 
-    if exclude_awareness:
-        df = df.loc[lambda d: ~d["modality"].isin(AWARENESS_MODS)]
+        grouper = grouper_for(profile)
+        if grouper != grouper_for(None):
+            data = data.groupby(grouper, as_index=False, dropna=False, observed=True)[
+                values
+            ].sum()
 
-    if exclude_idrc or exclude_students or exclude_awareness:
-        grouper = [c for c in grouper if c != "modality"]
+        variants[name] = data.reset_index(drop=True)
 
-    if exclude_china:
-        df = df.loc[lambda d: d["recipient_code"] != 730]
+    return variants
 
-    df = df.groupby(grouper, as_index=False, dropna=False, observed=True)[
-        [flow_type]
-    ].sum()
 
-    if prices == "constant":
-        df = to_constant(df, base_year=base_year, column=flow_type)
+def exclusion_profiles() -> dict[str, ExclusionProfile]:
+    """Every combination of exclusions, named after what they exclude"""
+    names = [f.name for f in fields(ExclusionProfile)]
+
+    profiles = {}
+    for flags in itertools.product([False, True], repeat=len(names)):
+        name = "+".join(n for n, flag in zip(names, flags) if flag) or "none"
+        profiles[name] = ExclusionProfile(*flags)
+
+    return profiles
+
+
+def with_exclusions(df: pd.DataFrame, profile: ExclusionProfile) -> pd.DataFrame:
+    """Add the flags of an exclusion profile as `exclude_*` columns, first"""
+    flags = pd.DataFrame(
+        {f"exclude_{k}": v for k, v in asdict(profile).items()}, index=df.index
+    )
+
+    return pd.concat([flags, df], axis=1)
+
+
+def get_crs_sensitivity(
+    donors: list[int | str] | None,
+    start_year: int = 2019,
+    end_year: int = 2023,
+    oda_only: bool = True,
+    non_oda_only: bool = False,
+    prices: str = "constant",
+    base_year: int | list[int | None] = 2019,
+    flow_type: str = "usd_commitment",
+    include_modality: bool = False,
+    by_donor: bool = True,
+    by_recipient: bool = True,
+    profiles: dict[str, ExclusionProfile] | None = None,
+) -> pd.DataFrame:
+    """Get CRS data for several exclusion profiles (by default, every combination)
+    as a single frame, with one `exclude_*` column per exclusion.
+
+    The data is read and grouped by modality and recipient once. Each profile then
+    only costs a mask and a sum (see `get_crs_variants`).
+
+    Modalities are only kept (with `include_modality`) by the profiles which don't
+    exclude any, so they are left out by default.
+    """
+    if profiles is None:
+        profiles = exclusion_profiles()
+
+    variants = get_crs_variants(
+        profiles,
+        donors=donors,
+        start_year=start_year,
+        end_year=end_year,
+        oda_only=oda_only,
+        non_oda_only=non_oda_only,
+        prices=prices,
+        base_year=base_year,
+        flow_type=flow_type,
+        include_modality=include_modality,
+        by_donor=by_donor,
+        by_recipient=by_recipient,
+    )
+
+    return concat(
+        [with_exclusions(variants[name], p) for name, p in profiles.items()],
+        ignore_index=True,
+    )
+
+
+def get_crs_data(
+    donors: list[int | str] | None,
+    start_year: int = 2019,
+    end_year: int = 2023,
+    oda_only: bool = True,
+    non_oda_only: bool = False,
+    prices: str = "constant",
+    base_year: int | list[int | None] = 2019,
+    flow_type: str = "usd_commitment",
+    exclude_china: bool = EXCLUDE_CHINA,
+    exclude_idrc: bool = EXCLUDE_IDRC,
+    exclude_students: bool = EXCLUDE_STUDENTS,
+    exclude_awareness: bool = EXCLUDE_AWARENESS,
+    additional_grouper: list[str] | None = None,
+    include_modality: bool = True,
+    by_donor: bool = True,
+    by_recipient: bool = True,
+):
+    """Get the total ODA for the given years.
+
+    If `base_year` is a list, the data is returned with one value column per price
+    basis (e.g. `value_current`, `value_2015constant`) and `prices` is ignored.
+
+    The data is aggregated directly to the requested breakdown (`by_donor`,
+    `by_recipient`). Deflators are by donor, so when converting to constant prices
+    the donors are only grouped after deflating.
+    """
+    profile = ExclusionProfile(
+        china=exclude_china,
+        idrc=exclude_idrc,
+        students=exclude_students,
+        awareness=exclude_awareness,
+    )
 
-    return df.rename(columns={flow_type: "value"})
+    return get_crs_variants(
+        {"data": profile},
+        donors=donors,
+        start_year=start_year,
+        end_year=end_year,
+        oda_only=oda_only,
+        non_oda_only=non_oda_only,
+        prices=prices,
+        base_year=base_year,
+        flow_type=flow_type,
+        additional_grouper=additional_grouper,
+        include_modality=include_modality,
+        by_donor=by_donor,
+        by_recipient=by_recipient,
+    )["data"]
 
 
+@stage("group_donors")
 def group_donors(df: pd.DataFrame) -> pd.DataFrame:
     """Group the data by donor"""
 
@@ -190,6 +429,7 @@ def group_donors(df: pd.DataFrame) -> pd.DataFrame:
     ].sum()
 
 
+@stage("group_recipients")
 def group_recipients(df: pd.DataFrame) -> pd.DataFrame:
     grouper = [
         c for c in df.columns if c not in ["recipient_code", "recipient_name", "value"]
@@ -210,7 +450,7 @@ def add_donor_name(df: pd.DataFrame) -> pd.DataFrame:
 
 def filter_dev_countries(df: pd.DataFrame) -> pd.DataFrame:
     if "recipient_code" in df.columns:
-        df = df.loc[lambda d: d["recipient_code"].isin(DEV_COUNTRIES.keys())]
+        df = df.loc[lambda d: in_group(d["recipient_code"], developing_countries())]
 
     return df
 
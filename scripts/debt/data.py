@@ -1,13 +1,18 @@
 import pandas as pd
-from bblocks import set_bblocks_data_path, DebtIDS, convert_id
+from bblocks import set_bblocks_data_path
 
 from scripts import config
 from scripts.dac_data.tools import key_statistics
+from scripts.debt.ids import debt_service_categories, load_ids
+from scripts.deflators import price_column
 from scripts.drm.tools import (
     to_constant,
     keep_emde_only,
 )
-from scripts.tools import export_json
+from scripts.iso_codes import name_to_iso3
+from scripts.profiling import stage
+from scripts.schema import to_categorical
+from scripts.tools import export_json, export_table
 
 set_bblocks_data_path(config.Paths.raw_data)
 
@@ -44,17 +49,9 @@ def get_non_concessional_lending(
     else:
         indicator1, indicator2 = "DT.DIS.MLAT.CD", "DT.DIS.MLTC.CD"
 
-    ids = DebtIDS()
-
-    ids.load_data(
+    df = load_ids(
         indicators=[indicator1, indicator2], start_year=start_year, end_year=end_year
-    )
-
-    df = (
-        ids.get_data()
-        .loc[lambda d: d.counterpart_area != "World"]
-        .assign(year=lambda d: d.year.dt.year)
-    )
+    ).loc[lambda d: d.counterpart_area != "World"]
 
     if exclude_china_country:
         df = df.loc[lambda d: d.country != "China"]
@@ -85,9 +82,7 @@ def get_non_concessional_lending(
 
     dfp["value"] = dfp[indicator1] - dfp[indicator2]
 
-    dfp["iso_code"] = convert_id(
-        dfp.country, from_type="regex", to_type="ISO3", not_found=pd.NA
-    )
+    dfp["iso_code"] = name_to_iso3(dfp.country, not_found=pd.NA)
 
     if prices == "constant":
         dfp = to_constant(dfp)
@@ -113,17 +108,17 @@ def export_bilateral():
         end_year=2022,
     )
 
-    total.to_csv(
+    export_table(
+        total,
         config.Paths.output
         / "non_concessional_lending"
         / "non_concessional_bilateral.csv",
-        index=False,
     )
-    no_china.to_csv(
+    export_table(
+        no_china,
         config.Paths.output
         / "non_concessional_lending"
         / "non_concessional_bilateral_excl_china.csv",
-        index=False,
     )
 
     total_stats = key_statistics(total, indicator="all_bilateral")
@@ -154,17 +149,17 @@ def export_multilateral():
         only_mdbs=False,
     )
 
-    total.to_csv(
+    export_table(
+        total,
         config.Paths.output
         / "non_concessional_lending"
         / "non_concessional_multilateral.csv",
-        index=False,
     )
-    exclude_china.to_csv(
+    export_table(
+        exclude_china,
         config.Paths.output
         / "non_concessional_lending"
         / "non_concessional_multilateral_excl_china.csv",
-        index=False,
     )
 
     total_stats = key_statistics(total, indicator="multilateral")
@@ -178,46 +173,81 @@ def export_multilateral():
     )
 
 
-def export_debt_oecd(
-    indicator: str = "debt_service",
-    start_year: int = 2015,
-    end_year: int = 2025,
-    prices: str = "constant",
-    base_year: int | None = 2019,
-    by_creditor: bool = False,
-    by_debt_type: bool = False,
-    only_emde: bool = True,
-):
-    suffix = f"{base_year}constant" if prices == "constant" else "current"
-    suffix += "_by_creditor" if by_creditor else ""
-    suffix += "_by_debt_type" if by_debt_type else ""
-    suffix += "_emde_only" if only_emde else ""
-
-    ids = DebtIDS()
-    debt_service = {
-        k: v.split(" ")[0] for k, v in ids.debt_service_indicators().items()
-    }
-
+DEBT_OECD_GROUPERS: dict[str, list[str]] = {
+    "total": ["year", "iso_code", "country", "prices", "units"],
+    "by_debt_type": ["year", "iso_code", "country", "debt_type", "prices", "units"],
+    "by_creditor": [
+        "year",
+        "iso_code",
+        "country",
+        "creditor_iso_code",
+        "creditor",
+        "prices",
+        "units",
+    ],
+    "by_creditor_by_debt_type": [
+        "year",
+        "iso_code",
+        "country",
+        "creditor_iso_code",
+        "creditor",
+        "debt_type",
+        "prices",
+        "units",
+    ],
+}
+
+
+# The levels exported by `export_oecd_versions`
+VERSION_LEVELS: tuple[str, ...] = ("total", "by_debt_type", "by_creditor_by_debt_type")
+
+
+def _debt_oecd_level(by_creditor: bool, by_debt_type: bool) -> str:
+    """Name of the aggregation level for the given breakdowns"""
+    if by_creditor:
+        return "by_creditor_by_debt_type" if by_debt_type else "by_creditor"
+
+    return "by_debt_type" if by_debt_type else "total"
+
+
+def debt_oecd_indicators(indicator: str) -> list[str]:
+    """IDS indicators used by an OECD debt export"""
     if indicator == "debt_service":
-        indicators = list(debt_service)
+        return list(debt_service_categories())
 
     if indicator == "bilateral_non_concessional_debt_disbursements":
-        indicators = ["DT.DIS.BLAT.CD", "DT.DIS.BLTC.CD"]
+        return ["DT.DIS.BLAT.CD", "DT.DIS.BLTC.CD"]
 
     if indicator == "multilateral_non_concessional_debt_disbursements":
-        indicators = ["DT.DIS.MLAT.CD", "DT.DIS.MLTC.CD"]
+        return ["DT.DIS.MLAT.CD", "DT.DIS.MLTC.CD"]
+
+    raise ValueError(f"Indicator {indicator} is not available")
 
-    ids.load_data(indicators=indicators, start_year=start_year, end_year=end_year)
+
+def get_debt_oecd(
+    indicator: str = "debt_service",
+    start_year: int = 2015,
+    end_year: int = 2025,
+    only_emde: bool = True,
+) -> pd.DataFrame:
+    """Debt data by creditor and debt type, in current USD million.
+
+    This is the finest level at which the OECD debt outputs are published. Every
+    other level is a roll-up of this frame (see `rollup_debt_oecd`).
+    """
+
+    debt_service = debt_service_categories()
+    indicators = debt_oecd_indicators(indicator)
 
     df = (
-        ids.get_data()
+        load_ids(indicators=indicators, start_year=start_year, end_year=end_year)
         .loc[lambda d: d.counterpart_area != "World"]
         .assign(
-            year=lambda d: d.year.dt.year,
             value=lambda d: d.value / 1e6,
             units="USD million",
-            prices=prices,
+            prices="current",
         )
+        .pipe(to_categorical)
     )
 
     if indicator == "debt_service":
@@ -236,16 +266,12 @@ def export_debt_oecd(
 
         df = df.drop(columns=indicators)
 
-    df["iso_code"] = convert_id(
-        df.country, from_type="regex", to_type="ISO3", not_found=pd.NA
-    )
+    df["iso_code"] = name_to_iso3(df.country, not_found=pd.NA)
 
     df = df.loc[lambda d: d.iso_code.notna()]
 
-    df["counterpart_iso_code"] = convert_id(
+    df["counterpart_iso_code"] = name_to_iso3(
         df.counterpart_area,
-        from_type="regex",
-        to_type="ISO3",
         not_found="",
         additional_mapping={
             "Korea, D.P.R. of": "PRK",
@@ -257,9 +283,6 @@ def export_debt_oecd(
     if only_emde:
         df = keep_emde_only(df)
 
-    if prices == "constant":
-        df = to_constant(df, base_year=base_year)
-
     df = df.rename(
         columns={
             "counterpart_iso_code": "creditor_iso_code",
@@ -267,127 +290,116 @@ def export_debt_oecd(
         }
     )
 
-    if not by_creditor:
-        if not by_debt_type:
-            df = (
-                df.groupby(
-                    ["year", "iso_code", "country", "prices", "units"],
-                    observed=True,
-                    dropna=False,
-                )["value"]
-                .sum()
-                .reset_index()
-            )
-        else:
-            df = (
-                df.groupby(
-                    ["year", "iso_code", "country", "debt_type", "prices", "units"],
-                    observed=True,
-                    dropna=False,
-                )["value"]
-                .sum()
-                .reset_index()
-            )
+    return rollup_debt_oecd(to_categorical(df), level="by_creditor_by_debt_type")
+
 
-    df = df.filter(
-        [
-            "year",
-            "iso_code",
-            "country",
-            "creditor_iso_code",
-            "creditor",
-            "debt_type",
-            "prices",
-            "units",
-            "value",
-        ]
+def debt_oecd_to_constant(df: pd.DataFrame, base_year: int) -> pd.DataFrame:
+    """Convert a current prices debt frame to constant prices"""
+    return to_constant(
+        df.assign(prices="constant").pipe(to_categorical), base_year=base_year
     )
 
+
+@stage("group_debt")
+def rollup_debt_oecd(
+    df: pd.DataFrame, level: str, values: list[str] | None = None
+) -> pd.DataFrame:
+    """Aggregate a debt frame to one of the levels in DEBT_OECD_GROUPERS"""
+    if values is None:
+        values = ["value"]
+
+    grouper = [c for c in DEBT_OECD_GROUPERS[level] if c in df.columns]
+
+    return df.groupby(grouper, observed=True, dropna=False)[values].sum().reset_index()
+
+
+def _write_debt_oecd(
+    df: pd.DataFrame, indicator: str, start_year: int, suffix: str
+) -> None:
+    """Save a debt frame, naming it after the last year with data"""
     end_year = df.loc[lambda d: (d.value != 0) & d.value.notna()].year.max()
     suffix += f"_{start_year}_{end_year}"
 
-    df.value = df.value.round(4)
+    df = df.assign(value=lambda d: d.value.round(4))
 
-    df.to_csv(
+    export_table(
+        df,
         config.Paths.output / "oecd" / f"{indicator}_{suffix}.csv",
-        index=False,
     )
 
 
-def export_oecd_versions(
-    indicator: str, start_year: int = 2015, end_year: int = 2025, base_year: int = 2015
-) -> None:
-    export_debt_oecd(
-        indicator=indicator,
-        start_year=start_year,
-        end_year=end_year,
-        prices="constant",
-        base_year=base_year,
-        by_creditor=False,
-        by_debt_type=False,
-        only_emde=False,
-    )
-    export_debt_oecd(
-        indicator=indicator,
-        start_year=start_year,
-        end_year=end_year,
-        prices="current",
-        base_year=None,
-        by_creditor=False,
-        by_debt_type=False,
-        only_emde=False,
-    )
+def _debt_oecd_suffix(
+    prices: str, base_year: int | None, level: str, only_emde: bool
+) -> str:
+    suffix = f"{base_year}constant" if prices == "constant" else "current"
+    suffix += "" if level == "total" else f"_{level}"
+    suffix += "_emde_only" if only_emde else ""
 
-    export_debt_oecd(
-        indicator=indicator,
-        start_year=start_year,
-        end_year=end_year,
-        prices="constant",
-        base_year=base_year,
-        by_creditor=False,
-        by_debt_type=True,
-        only_emde=False,
-    )
-    export_debt_oecd(
+    return suffix
+
+
+def export_debt_oecd(
+    indicator: str = "debt_service",
+    start_year: int = 2015,
+    end_year: int = 2025,
+    prices: str = "constant",
+    base_year: int | None = 2019,
+    by_creditor: bool = False,
+    by_debt_type: bool = False,
+    only_emde: bool = True,
+):
+    level = _debt_oecd_level(by_creditor=by_creditor, by_debt_type=by_debt_type)
+
+    df = get_debt_oecd(
         indicator=indicator,
         start_year=start_year,
         end_year=end_year,
-        prices="current",
-        base_year=None,
-        by_creditor=False,
-        by_debt_type=True,
-        only_emde=False,
+        only_emde=only_emde,
     )
 
-    export_debt_oecd(
+    if prices == "constant":
+        df = debt_oecd_to_constant(df, base_year=base_year)
+
+    _write_debt_oecd(
+        rollup_debt_oecd(df, level=level),
         indicator=indicator,
         start_year=start_year,
-        end_year=end_year,
-        prices="constant",
-        base_year=base_year,
-        by_creditor=True,
-        by_debt_type=True,
-        only_emde=False,
+        suffix=_debt_oecd_suffix(prices, base_year, level, only_emde),
     )
-    export_debt_oecd(
+
+
+def export_oecd_versions(
+    indicator: str,
+    start_year: int = 2015,
+    end_year: int = 2025,
+    base_year: int = 2015,
+    only_emde: bool = False,
+) -> None:
+    """Export every level of an indicator, in current and constant prices.
+
+    The data is loaded once, at the finest level, and converted to both price bases
+    in a single pass. Every output is rolled up from it.
+    """
+    base_years = [None, base_year]
+    values = [price_column("value", b) for b in base_years]
+
+    data = get_debt_oecd(
         indicator=indicator,
         start_year=start_year,
         end_year=end_year,
-        prices="current",
-        base_year=None,
-        by_creditor=True,
-        by_debt_type=True,
-        only_emde=False,
-    )
+        only_emde=only_emde,
+    ).pipe(to_constant, base_year=base_years)
 
+    for level in VERSION_LEVELS:
+        rolled = rollup_debt_oecd(data.drop(columns="prices"), level, values=values)
 
-if __name__ == "__main__":
-    export_bilateral()
-    export_multilateral()
-    export_oecd_versions(indicator="debt_service", base_year=2015)
-    export_oecd_versions(
-        indicator="bilateral_non_concessional_debt_disbursements", base_year=2015
-    )
-    export_oecd_versions(
-        indicator="multilateral_non_concessional_debt_disbursements", base_year=2015
-    )
+        for base, value in zip(base_years, values):
+            prices = "current" if base is None else "constant"
+            df = rolled.rename(columns={value: "value"}).assign(prices=prices)
+
+            _write_debt_oecd(
+                df.filter(DEBT_OECD_GROUPERS[level] + ["value"]),
+                indicator=indicator,
+                start_year=start_year,
+                suffix=_debt_oecd_suffix(prices, base, level, only_emde),
+            )
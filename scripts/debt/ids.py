@@ -0,0 +1,99 @@
+"""Disk cache for International Debt Statistics (IDS) data.
+
+Loading IDS indicators through `DebtIDS` reads and concatenates one feather file per
+indicator on every call. The cleaned frame is stored here as parquet, keyed by the
+indicators and years requested, and reused as long as the raw files it was built
+from are unchanged.
+"""
+
+import hashlib
+import json
+from functools import cache
+
+import pandas as pd
+from bblocks import DebtIDS, set_bblocks_data_path
+
+from scripts import config
+from scripts.logger import logger
+from scripts.profiling import stage
+from scripts.schema import to_categorical
+
+set_bblocks_data_path(config.Paths.raw_data)
+
+IDS_RAW_PATH = config.Paths.raw_data / "ids_data"
+IDS_CACHE_PATH = config.Paths.raw_data / "ids_cache"
+
+
+def _raw_hash(indicators: list[str]) -> str:
+    """Hash the content of the raw files stored by bblocks for the indicators"""
+    digest = hashlib.sha256()
+
+    if not IDS_RAW_PATH.exists():
+        return ""
+
+    files = sorted(
+        f
+        for f in IDS_RAW_PATH.iterdir()
+        if any(indicator in f.name for indicator in indicators)
+    )
+
+    for file in files:
+        digest.update(file.name.encode())
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(1024**2), b""):
+                digest.update(chunk)
+
+    return digest.hexdigest() if files else ""
+
+
+def _cache_key(indicators: list[str], start_year: int, end_year: int) -> str:
+    key = json.dumps([sorted(indicators), start_year, end_year])
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+@stage("load_ids")
+def load_ids(indicators: list[str], start_year: int, end_year: int) -> pd.DataFrame:
+    """Load IDS indicators, with the year as an integer and categorical labels.
+
+    The result is read from the disk cache when the raw files have not changed since
+    it was stored. Otherwise, it is loaded through `DebtIDS` and the cache refreshed.
+    """
+    key = _cache_key(indicators, start_year, end_year)
+    data_path = IDS_CACHE_PATH / f"{key}.parquet"
+    meta_path = IDS_CACHE_PATH / f"{key}.json"
+
+    raw_hash = _raw_hash(indicators)
+
+    if raw_hash and data_path.exists() and meta_path.exists():
+        with open(meta_path, "r") as f:
+            if json.load(f)["raw_hash"] == raw_hash:
+                logger.debug(f"IDS cache: using {key} for {indicators}")
+                return pd.read_parquet(data_path).pipe(to_categorical)
+
+    ids = DebtIDS()
+    ids.load_data(indicators=indicators, start_year=start_year, end_year=end_year)
+
+    df = ids.get_data().assign(year=lambda d: d.year.dt.year).pipe(to_categorical)
+
+    IDS_CACHE_PATH.mkdir(exist_ok=True)
+    df.to_parquet(data_path, index=False)
+    with open(meta_path, "w") as f:
+        json.dump(
+            {
+                "indicators": sorted(indicators),
+                "start_year": start_year,
+                "end_year": end_year,
+                # The raw files may have been downloaded by this load
+                "raw_hash": _raw_hash(indicators),
+            },
+            f,
+            indent=4,
+        )
+
+    return df
+
+
+@cache
+def debt_service_categories() -> dict[str, str]:
+    """Debt service indicators, mapped to their debt type (e.g. 'Bilateral')"""
+    return {k: v.split(" ")[0] for k, v in DebtIDS.debt_service_indicators().items()}
@@ -0,0 +1,132 @@
+"""Deflator tables, built once per run and applied as a vectorised lookup.
+
+`pydeflate.deflate` loads and reshapes its deflator and exchange data on every call.
+Here each (entity, year) factor is computed once per source and base year, by
+deflating a frame of ones, and kept in memory. Converting a frame to constant
+prices is then a single multiplication by the looked up factors.
+"""
+
+import numpy as np
+import pandas as pd
+from pydeflate import deflate, set_pydeflate_path
+
+from scripts import config
+from scripts.profiling import stage
+
+set_pydeflate_path(config.Paths.raw_data)
+
+DEFLATOR_SOURCES: dict[str, dict[str, str]] = {
+    "dac": {
+        "deflator_source": "oecd_dac",
+        "deflator_method": "dac_deflator",
+        "exchange_source": "oecd_dac",
+        "id_type": "DAC",
+    },
+    "imf": {
+        "deflator_source": "imf",
+        "deflator_method": "gdp",
+        "exchange_source": "imf",
+        "id_type": "ISO3",
+    },
+}
+
+# (source, base_year) -> {(entity, year): factor}
+_TABLES: dict[tuple[str, int], dict[tuple, float]] = {}
+
+
+def deflator_table(source: str, base_year: int, keys: list[tuple]) -> dict:
+    """Get the factors for the (entity, year) keys, computing only missing ones"""
+    table = _TABLES.setdefault((source, base_year), {})
+
+    missing = [key for key in keys if key not in table and not pd.isna(key[0])]
+
+    if missing:
+        units = pd.DataFrame(missing, columns=["entity", "year"]).assign(factor=1.0)
+        with stage("pydeflate"):
+            factors = deflate(
+                df=units,
+                base_year=base_year,
+                source_currency="USA",
+                target_currency="USA",
+                id_column="entity",
+                date_column="year",
+                source_column="factor",
+                target_column="factor",
+                **DEFLATOR_SOURCES[source],
+            )
+        table.update(zip(missing, factors["factor"].astype(float)))
+
+    return table
+
+
+def price_column(column: str, base_year: int | None) -> str:
+    """Name of the column holding values in the prices of a base year.
+
+    A base year of None stands for current prices.
+    """
+    return f"{column}_current" if base_year is None else f"{column}_{base_year}constant"
+
+
+def _factors(
+    rows: pd.MultiIndex, keys: pd.MultiIndex, source: str, base_year: int
+) -> np.ndarray:
+    """The factor for every row, aligned with the rows"""
+    table = deflator_table(source=source, base_year=base_year, keys=list(keys))
+
+    # The trailing null factor is used for rows whose keys can't be matched
+    factors = np.array([table.get(key, np.nan) for key in keys] + [np.nan])
+
+    return factors[keys.get_indexer(rows)]
+
+
+@stage("deflate")
+def apply_deflator(
+    df: pd.DataFrame,
+    source: str,
+    base_year: int,
+    id_column: str,
+    column: str = "value",
+    date_column: str = "year",
+) -> pd.DataFrame:
+    """Convert a column to constant prices of the base year.
+
+    Rows for which there is no deflator are returned as null values, as with
+    `pydeflate.deflate`.
+    """
+    rows = pd.MultiIndex.from_frame(df[[id_column, date_column]])
+
+    df = df.copy()
+    df[column] = df[column].astype("float64") * _factors(
+        rows, rows.unique(), source=source, base_year=base_year
+    )
+
+    return df
+
+
+@stage("deflate")
+def apply_deflators(
+    df: pd.DataFrame,
+    source: str,
+    base_years: list[int | None],
+    id_column: str,
+    column: str = "value",
+    date_column: str = "year",
+) -> pd.DataFrame:
+    """Convert a column to several price bases in one pass.
+
+    The column is replaced by one column per base year, named with `price_column`.
+    A base year of None keeps the values in current prices.
+    """
+    rows = pd.MultiIndex.from_frame(df[[id_column, date_column]])
+    keys = rows.unique()
+    values = df[column].astype("float64")
+
+    df = df.drop(columns=column)
+    for base_year in base_years:
+        df[price_column(column, base_year)] = (
+            values
+            if base_year is None
+            else values * _factors(rows, keys, source=source, base_year=base_year)
+        )
+
+    return df
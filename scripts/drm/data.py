@@ -1,9 +1,10 @@
 import pandas as pd
-from bblocks import WorldEconomicOutlook, set_bblocks_data_path
+from bblocks import set_bblocks_data_path
 
 from scripts import config
 from scripts.config import DRM_INDICATOR, EXCLUDE_CHINA
 from scripts.dac_data.tools import key_statistics
+from scripts.deflators import price_column
 from scripts.drm.tools import (
     gdp2usd,
     to_constant,
@@ -11,7 +12,8 @@ from scripts.drm.tools import (
     group_countries,
     keep_emde_only,
 )
-from scripts.tools import export_json
+from scripts.tools import export_json, export_table
+from scripts.weo import get_weo
 
 set_bblocks_data_path(config.Paths.raw_data)
 
@@ -28,18 +30,19 @@ def get_drm(
     by_country: bool = False,
     only_emde: bool = True,
     prices: str = "constant",
-    base_year: int = 2019,
+    base_year: int | list[int | None] = 2019,
     exclude_china_data: bool = EXCLUDE_CHINA,
     keep_metadata: bool = False,
 ) -> pd.DataFrame:
-    """DRM data for the specified indicator, as millions of USD."""
+    """DRM data for the specified indicator, as millions of USD.
 
-    weo = WorldEconomicOutlook(year=2024, release=1)
-    weo.load_data(indicator=indicator)
+    If `base_year` is a list, the data is returned with one value column per price
+    basis (e.g. `value_current`, `value_2015constant`) and `prices` is ignored.
+    """
 
     # As percent of GDP
-    data = weo.get_data(keep_metadata=keep_metadata).assign(
-        year=lambda d: d.year.dt.year, value=lambda d: d.value / 100
+    data = get_weo(indicator, keep_metadata=keep_metadata).assign(
+        value=lambda d: d.value / 100
     )
 
     # Filter years
@@ -52,16 +55,21 @@ def get_drm(
     # As USD
     data = gdp2usd(data)
 
-    if prices == "constant":
+    if isinstance(base_year, list):
         data = to_constant(data, base_year=base_year)
+        values = [price_column("value", b) for b in base_year]
+    else:
+        if prices == "constant":
+            data = to_constant(data, base_year=base_year)
+        values = ["value"]
 
     if exclude_china_data:
         data = exclude_china(data)
 
     if not by_country:
-        data = group_countries(data)
+        data = group_countries(data, values=values)
 
-    return data.assign(value=lambda d: (d.value.astype(float) / 1e6).round(3))
+    return data.assign(**{v: (data[v].astype(float) / 1e6).round(3) for v in values})
 
 
 def export_drm_data(exclude_china_data: bool = False):
@@ -76,9 +84,9 @@ def export_drm_data(exclude_china_data: bool = False):
 
     stats = key_statistics(df, "drm", max_year=2022)
 
-    df.to_csv(
+    export_table(
+        df,
         config.Paths.output / "drm" / f"domestic_revenues_constant{suffix}.csv",
-        index=False,
     )
 
     export_json(
@@ -94,37 +102,51 @@ def export_drm_oecd(
     base_year: int = 2019,
     only_emde: bool = True,
 ):
-    suffix = f"constant_{base_year}" if prices == "constant" else "current"
-    suffix += "_emde" if only_emde else ""
+    export_drm_oecd_versions(
+        start_year=start_year,
+        end_year=end_year,
+        base_years=[base_year if prices == "constant" else None],
+        only_emde=only_emde,
+    )
 
-    df = get_drm(
+
+def export_drm_oecd_versions(
+    start_year: int = 2015,
+    end_year: int = 2028,
+    base_years: list[int | None] | None = None,
+    only_emde: bool = True,
+):
+    """Export DRM data in several price bases from a single load.
+
+    A base year of None stands for current prices.
+    """
+    if base_years is None:
+        base_years = [None, 2015]
+
+    data = get_drm(
         indicator=INDICATORS[DRM_INDICATOR],
         start_year=start_year,
         end_year=end_year,
         by_country=True,
         only_emde=only_emde,
         exclude_china_data=False,
-        prices=prices,
-        base_year=base_year,
+        base_year=base_years,
         keep_metadata=True,
     )
 
-    df = df.filter(
-        ["year", "entity_name", "iso_code", "estimate", "indicator_name", "value"]
-    ).assign(units="USD million")
+    for base_year in base_years:
+        suffix = f"constant_{base_year}" if base_year is not None else "current"
+        suffix += "_emde" if only_emde else ""
 
-    df.value = df.value.round(4)
+        df = data.rename(columns={price_column("value", base_year): "value"})
 
-    df.to_csv(
-        config.Paths.output / "oecd" / f"domestic_revenues_{suffix}.csv",
-        index=False,
-    )
+        df = df.filter(
+            ["year", "entity_name", "iso_code", "estimate", "indicator_name", "value"]
+        ).assign(units="USD million")
 
+        df.value = df.value.round(4)
 
-if __name__ == "__main__":
-    # export_drm_data(exclude_china_data=False)
-    # export_drm_data(exclude_china_data=True)
-    export_drm_oecd(base_year=2015)
-    export_drm_oecd(only_emde=False, base_year=2015)
-    export_drm_oecd(prices="current", base_year=None)
-    export_drm_oecd(prices="current", base_year=None, only_emde=False)
+        export_table(
+            df,
+            config.Paths.output / "oecd" / f"domestic_revenues_{suffix}.csv",
+        )
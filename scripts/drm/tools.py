@@ -1,24 +1,21 @@
 import pandas as pd
 
-from bblocks import (
-    WorldEconomicOutlook,
-    set_bblocks_data_path,
-    add_income_level_column,
-    add_iso_codes_column,
-)
-from pydeflate import deflate, set_pydeflate_path
+from bblocks import set_bblocks_data_path
 
 from scripts import config
+from scripts.deflators import apply_deflator, apply_deflators
+from scripts.groups import CHINA_ISO3, emde_iso_codes, in_group
+from scripts.profiling import stage
+from scripts.weo import get_weo
 
 set_bblocks_data_path(config.Paths.raw_data)
-set_pydeflate_path(config.Paths.raw_data)
 
 
 def get_usd_gdp() -> pd.DataFrame:
-    weo = WorldEconomicOutlook(year=2024, release=1)
-    weo.load_data(indicator=["NGDPD"])
     data = (
-        weo.get_data().rename(columns={"value": "gdp_usd"}).drop(columns=["indicator"])
+        get_weo("NGDPD")
+        .rename(columns={"value": "gdp_usd"})
+        .drop(columns=["indicator"])
     )
 
     # from billion to usd
@@ -32,7 +29,7 @@ def gdp2usd(data: pd.DataFrame) -> pd.DataFrame:
     Convert GDP data to USD
     """
 
-    gdp = get_usd_gdp().assign(year=lambda d: d.year.dt.year)
+    gdp = get_usd_gdp()
 
     data = data.merge(gdp, on=["iso_code", "year"], how="left")
 
@@ -43,211 +40,43 @@ def gdp2usd(data: pd.DataFrame) -> pd.DataFrame:
     return data
 
 
-def to_constant(df: pd.DataFrame, base_year: int = 2019) -> pd.DataFrame:
+def to_constant(
+    df: pd.DataFrame, base_year: int | list[int | None] = 2019
+) -> pd.DataFrame:
     """
-    Convert data to constant USD
+    Convert data to constant USD, using IMF GDP deflators.
+
+    If a list of base years is passed, the value column is replaced by one column
+    per price basis (see `price_column`), where None stands for current prices.
     """
-    df = deflate(
-        df=df,
-        base_year=base_year,
-        deflator_source="imf",
-        deflator_method="gdp",
-        exchange_source="imf",
-        source_currency="USA",
-        target_currency="USA",
-        id_column="iso_code",
-        id_type="ISO3",
-        date_column="year",
-        source_column="value",
-        target_column="value",
-    )
+    if isinstance(base_year, list):
+        return apply_deflators(
+            df, source="imf", base_years=base_year, id_column="iso_code"
+        )
 
-    return df
+    return apply_deflator(df, source="imf", base_year=base_year, id_column="iso_code")
 
 
 def exclude_china(data: pd.DataFrame) -> pd.DataFrame:
-    return data.loc[lambda d: d.iso_code != "CHN"]
+    return data.loc[lambda d: ~in_group(d.iso_code, {CHINA_ISO3})]
 
 
 def keep_emde_only(data: pd.DataFrame) -> pd.DataFrame:
-    iso_list_to_keep = imf_emde()
-    data = data.loc[lambda d: d.iso_code.isin(iso_list_to_keep)]
-    return data
+    return data.loc[lambda d: in_group(d.iso_code, emde_iso_codes())]
 
 
-def group_countries(data: pd.DataFrame) -> pd.DataFrame:
+@stage("group_countries")
+def group_countries(
+    data: pd.DataFrame, values: list[str] | None = None
+) -> pd.DataFrame:
 
-    grouper = [c for c in data.columns if c not in ["iso_code", "value"]]
+    if values is None:
+        values = ["value"]
+
+    grouper = [c for c in data.columns if c not in ["iso_code", *values]]
 
     data = (
-        data.groupby(grouper, dropna=False, observed=True)[["value"]]
-        .sum()
-        .reset_index()
+        data.groupby(grouper, dropna=False, observed=True)[values].sum().reset_index()
     )
 
     return data
-
-
-def imf_emde():
-    countries = [
-        "Afghanistan",
-        "Albania",
-        "Algeria",
-        "Angola",
-        "Antigua and Barbuda",
-        "Argentina",
-        "Armenia",
-        "Aruba",
-        "Azerbaijan",
-        "The Bahamas",
-        "Bahrain",
-        "Bangladesh",
-        "Barbados",
-        "Belarus",
-        "Belize",
-        "Benin",
-        "Bhutan",
-        "Bolivia",
-        "Bosnia and Herzegovina",
-        "Botswana",
-        "Brazil",
-        "Brunei Darussalam",
-        "Bulgaria",
-        "Burkina Faso",
-        "Burundi",
-        "Cabo Verde",
-        "Cambodia",
-        "Cameroon",
-        "Central African Republic",
-        "Chad",
-        "Chile",
-        "China",
-        "Colombia",
-        "Comoros",
-        "Democratic Republic of the Congo",
-        "Republic of Congo",
-        "Costa Rica",
-        "Côte d'Ivoire",
-        "Djibouti",
-        "Dominica",
-        "Dominican Republic",
-        "Ecuador",
-        "Egypt",
-        "El Salvador",
-        "Equatorial Guinea",
-        "Eritrea",
-        "Eswatini",
-        "Ethiopia",
-        "Fiji",
-        "Gabon",
-        "The Gambia",
-        "Georgia",
-        "Ghana",
-        "Grenada",
-        "Guatemala",
-        "Guinea",
-        "Guinea-Bissau",
-        "Guyana",
-        "Haiti",
-        "Honduras",
-        "Hungary",
-        "India",
-        "Indonesia",
-        "Iran",
-        "Iraq",
-        "Jamaica",
-        "Jordan",
-        "Kazakhstan",
-        "Kenya",
-        "Kiribati",
-        "Kosovo",
-        "Kuwait",
-        "Kyrgyz Republic",
-        "Lao P.D.R.",
-        "Lebanon",
-        "Lesotho",
-        "Liberia",
-        "Libya",
-        "Madagascar",
-        "Malawi",
-        "Malaysia",
-        "Maldives",
-        "Mali",
-        "Marshall Islands",
-        "Mauritania",
-        "Mauritius",
-        "Mexico",
-        "Micronesia",
-        "Moldova",
-        "Mongolia",
-        "Montenegro",
-        "Morocco",
-        "Mozambique",
-        "Myanmar",
-        "Namibia",
-        "Nauru",
-        "Nepal",
-        "Nicaragua",
-        "Niger",
-        "Nigeria",
-        "North Macedonia",
-        "Oman",
-        "Pakistan",
-        "Palau",
-        "Panama",
-        "Papua New Guinea",
-        "Paraguay",
-        "Peru",
-        "Philippines",
-        "Poland",
-        "Qatar",
-        "Romania",
-        "Russia",
-        "Rwanda",
-        "Samoa",
-        "São Tomé and Príncipe",
-        "Saudi Arabia",
-        "Senegal",
-        "Serbia",
-        "Seychelles",
-        "Sierra Leone",
-        "Solomon Islands",
-        "Somalia",
-        "South Africa",
-        "South Sudan",
-        "Sri Lanka",
-        "St. Kitts and Nevis",
-        "St. Lucia",
-        "St. Vincent and the Grenadines",
-        "Sudan",
-        "Suriname",
-        "Syria",
-        "Tajikistan",
-        "Tanzania",
-        "Thailand",
-        "Timor-Leste",
-        "Togo",
-        "Tonga",
-        "Trinidad and Tobago",
-        "Tunisia",
-        "Türkiye",
-        "Turkmenistan",
-        "Tuvalu",
-        "Uganda",
-        "Ukraine",
-        "United Arab Emirates",
-        "Uruguay",
-        "Uzbekistan",
-        "Vanuatu",
-        "Venezuela",
-        "Vietnam",
-        "West Bank and Gaza",
-        "Yemen",
-        "Zambia",
-        "Zimbabwe",
-    ]
-
-    df = pd.DataFrame(countries, columns=["country"])
-    df = add_iso_codes_column(df=df, id_column="country", id_type="regex")
-
-    return df.iso_code.tolist()
@@ -0,0 +1,197 @@
+"""Country groups used across the project, as cached sets of codes.
+
+Group membership is resolved once per process. Filtering a column by a group then
+checks only the distinct values of the column, through its categorical codes.
+"""
+
+from functools import cache
+
+import numpy as np
+import pandas as pd
+
+from scripts import config
+from scripts.iso_codes import name_to_iso3
+
+CHINA_ISO3: str = "CHN"
+CHINA_DAC_CODE: int = 730
+
+# Emerging market and developing economies, as listed in the IMF WEO
+IMF_EMDE: list[str] = [
+    "Afghanistan",
+    "Albania",
+    "Algeria",
+    "Angola",
+    "Antigua and Barbuda",
+    "Argentina",
+    "Armenia",
+    "Aruba",
+    "Azerbaijan",
+    "The Bahamas",
+    "Bahrain",
+    "Bangladesh",
+    "Barbados",
+    "Belarus",
+    "Belize",
+    "Benin",
+    "Bhutan",
+    "Bolivia",
+    "Bosnia and Herzegovina",
+    "Botswana",
+    "Brazil",
+    "Brunei Darussalam",
+    "Bulgaria",
+    "Burkina Faso",
+    "Burundi",
+    "Cabo Verde",
+    "Cambodia",
+    "Cameroon",
+    "Central African Republic",
+    "Chad",
+    "Chile",
+    "China",
+    "Colombia",
+    "Comoros",
+    "Democratic Republic of the Congo",
+    "Republic of Congo",
+    "Costa Rica",
+    "Côte d'Ivoire",
+    "Djibouti",
+    "Dominica",
+    "Dominican Republic",
+    "Ecuador",
+    "Egypt",
+    "El Salvador",
+    "Equatorial Guinea",
+    "Eritrea",
+    "Eswatini",
+    "Ethiopia",
+    "Fiji",
+    "Gabon",
+    "The Gambia",
+    "Georgia",
+    "Ghana",
+    "Grenada",
+    "Guatemala",
+    "Guinea",
+    "Guinea-Bissau",
+    "Guyana",
+    "Haiti",
+    "Honduras",
+    "Hungary",
+    "India",
+    "Indonesia",
+    "Iran",
+    "Iraq",
+    "Jamaica",
+    "Jordan",
+    "Kazakhstan",
+    "Kenya",
+    "Kiribati",
+    "Kosovo",
+    "Kuwait",
+    "Kyrgyz Republic",
+    "Lao P.D.R.",
+    "Lebanon",
+    "Lesotho",
+    "Liberia",
+    "Libya",
+    "Madagascar",
+    "Malawi",
+    "Malaysia",
+    "Maldives",
+    "Mali",
+    "Marshall Islands",
+    "Mauritania",
+    "Mauritius",
+    "Mexico",
+    "Micronesia",
+    "Moldova",
+    "Mongolia",
+    "Montenegro",
+    "Morocco",
+    "Mozambique",
+    "Myanmar",
+    "Namibia",
+    "Nauru",
+    "Nepal",
+    "Nicaragua",
+    "Niger",
+    "Nigeria",
+    "North Macedonia",
+    "Oman",
+    "Pakistan",
+    "Palau",
+    "Panama",
+    "Papua New Guinea",
+    "Paraguay",
+    "Peru",
+    "Philippines",
+    "Poland",
+    "Qatar",
+    "Romania",
+    "Russia",
+    "Rwanda",
+    "Samoa",
+    "São Tomé and Príncipe",
+    "Saudi Arabia",
+    "Senegal",
+    "Serbia",
+    "Seychelles",
+    "Sierra Leone",
+    "Solomon Islands",
+    "Somalia",
+    "South Africa",
+    "South Sudan",
+    "Sri Lanka",
+    "St. Kitts and Nevis",
+    "St. Lucia",
+    "St. Vincent and the Grenadines",
+    "Sudan",
+    "Suriname",
+    "Syria",
+    "Tajikistan",
+    "Tanzania",
+    "Thailand",
+    "Timor-Leste",
+    "Togo",
+    "Tonga",
+    "Trinidad and Tobago",
+    "Tunisia",
+    "Türkiye",
+    "Turkmenistan",
+    "Tuvalu",
+    "Uganda",
+    "Ukraine",
+    "United Arab Emirates",
+    "Uruguay",
+    "Uzbekistan",
+    "Vanuatu",
+    "Venezuela",
+    "Vietnam",
+    "West Bank and Gaza",
+    "Yemen",
+    "Zambia",
+    "Zimbabwe",
+]
+
+
+@cache
+def emde_iso_codes() -> frozenset[str]:
+    """ISO3 codes of the IMF emerging market and developing economies"""
+    iso_codes = name_to_iso3(pd.Series(IMF_EMDE))
+    return frozenset(iso_codes.dropna())
+
+
+@cache
+def developing_countries() -> frozenset[int]:
+    """DAC codes of developing countries and regions, excluding China"""
+    return frozenset(config.DEV_COUNTRIES)
+
+
+def in_group(series: pd.Series, members: frozenset | set) -> np.ndarray:
+    """Boolean mask of the values of a column which belong to a group"""
+    codes = series.astype("category")
+    is_member = codes.cat.categories.isin(list(members))
+
+    # Missing values have code -1, which points to the trailing False
+    return np.append(is_member, False)[codes.cat.codes.to_numpy()]
@@ -0,0 +1,116 @@
+"""Country name to ISO3 conversion, resolved once per distinct name.
+
+Resolving names with regular expressions is slow, so every name is matched only
+once and the result is kept in a lookup file under `raw_data`. The file records the
+versions of the packages which did the matching, and is dropped when they change.
+Columns are then
+converted through their categorical codes, which means the work depends on the
+number of distinct names and not on the number of rows.
+"""
+
+import json
+from importlib import metadata
+
+import numpy as np
+import pandas as pd
+from bblocks import convert_id
+
+from scripts import config
+from scripts.profiling import stage
+
+ISO3_LOOKUP_PATH = config.Paths.raw_data / "iso3_lookup.json"
+
+# Packages whose upgrades can change how names are matched
+MATCHING_PACKAGES: tuple[str, ...] = ("bblocks", "country_converter")
+
+_LOOKUP: dict[str, str | None] | None = None
+
+
+def _matching_versions() -> dict[str, str | None]:
+    """Installed versions of the packages used to match names"""
+    versions = {}
+    for package in MATCHING_PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+
+    return versions
+
+
+def _lookup() -> dict[str, str | None]:
+    """The stored name to ISO3 lookup, read from disk on first use. A lookup saved
+    with other versions of the matching packages is discarded."""
+    global _LOOKUP
+
+    if _LOOKUP is None:
+        _LOOKUP = {}
+        if ISO3_LOOKUP_PATH.exists():
+            with open(ISO3_LOOKUP_PATH, "r") as f:
+                stored = json.load(f)
+            if stored.get("versions") == _matching_versions():
+                _LOOKUP = stored["names"]
+
+    return _LOOKUP
+
+
+def _resolve(names: list[str]) -> None:
+    """Match new names with regex and save them to the lookup"""
+    lookup = _lookup()
+
+    with stage("convert_id") as s:
+        s.rows_in = len(names)
+        converted = convert_id(
+            pd.Series(names, dtype="object"),
+            from_type="regex",
+            to_type="ISO3",
+            not_found=pd.NA,
+        )
+
+    lookup.update(
+        {name: (None if pd.isna(iso) else iso) for name, iso in zip(names, converted)}
+    )
+
+    temp = ISO3_LOOKUP_PATH.with_suffix(".tmp")
+    with open(temp, "w") as f:
+        json.dump(
+            {"versions": _matching_versions(), "names": dict(sorted(lookup.items()))},
+            f,
+            indent=4,
+            ensure_ascii=False,
+        )
+    temp.replace(ISO3_LOOKUP_PATH)
+
+
+def name_to_iso3(
+    series: pd.Series,
+    not_found: str | None = None,
+    additional_mapping: dict[str, str] | None = None,
+) -> pd.Series:
+    """Convert a column of country names to ISO3 codes.
+
+    Args:
+        series: the names to convert.
+        not_found: the value used for names which can't be matched. If None, the
+            names are returned as null values.
+        additional_mapping: names to map explicitly, which take precedence over the
+            regex matches.
+    """
+    codes = series.astype("category")
+    categories = codes.cat.categories.astype(str).tolist()
+
+    missing = [name for name in categories if name not in _lookup()]
+    if missing:
+        _resolve(missing)
+
+    mapping = _lookup() | (additional_mapping or {})
+
+    values = np.array(
+        [mapping.get(name) for name in categories] + [None], dtype="object"
+    )
+    values[pd.isna(values)] = not_found if not_found is not None else pd.NA
+
+    # Code -1 marks missing names, which point to the trailing not_found value
+    return pd.Series(
+        values[codes.cat.codes.to_numpy()], index=series.index, name=series.name
+    )
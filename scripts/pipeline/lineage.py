@@ -0,0 +1,110 @@
+"""Versions of the upstream sources, and the versions each output was built from.
+
+Source versions are read from `raw_data/data_updates.json`. The DAC sources (DAC1,
+DAC2A, CRS) fall back to the "OECD DAC" update date when they have no entry of
+their own. The WEO version is the release set in the config, and IDS falls back to
+a fingerprint of the raw files downloaded by bblocks.
+
+After a step runs, the source versions it used are stored in `output/lineage.json`.
+A step is up to date when those versions are unchanged and its outputs exist.
+"""
+
+import datetime
+import hashlib
+import json
+from pathlib import Path
+
+from scripts import config
+from scripts.pipeline.manifest import Step
+
+DATA_UPDATES_PATH: Path = config.Paths.raw_data / "data_updates.json"
+LINEAGE_PATH: Path = config.Paths.output / "lineage.json"
+
+SOURCES: tuple[str, ...] = ("DAC1", "DAC2A", "CRS", "IDS", "WEO")
+DAC_SOURCES: tuple[str, ...] = ("DAC1", "DAC2A", "CRS")
+
+
+def _read_json(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write_json(path: Path, data: dict) -> None:
+    temp = path.with_suffix(".tmp")
+    with open(temp, "w") as f:
+        json.dump(data, f, indent=4)
+    temp.replace(path)
+
+
+def _files_fingerprint(folder: Path) -> str | None:
+    """Names, sizes and modification times of the files in a folder"""
+    if not folder.exists():
+        return None
+    files = sorted(f for f in folder.iterdir() if f.is_file())
+    if not files:
+        return None
+
+    digest = hashlib.sha256()
+    for f in files:
+        digest.update(f"{f.name}:{f.stat().st_size}:{f.stat().st_mtime_ns}".encode())
+
+    return digest.hexdigest()[:16]
+
+
+def source_versions() -> dict[str, str | None]:
+    """The current version of every source"""
+    updates = _read_json(DATA_UPDATES_PATH)
+
+    versions = {source: updates.get(source) for source in SOURCES}
+
+    for source in DAC_SOURCES:
+        versions[source] = versions[source] or updates.get("OECD DAC")
+
+    versions["WEO"] = f"{config.WEO_YEAR}-{config.WEO_RELEASE}"
+    versions["IDS"] = versions["IDS"] or _files_fingerprint(
+        config.Paths.raw_data / "ids_data"
+    )
+
+    return versions
+
+
+def record_source_update(source: str, version: str | None = None) -> None:
+    """Record a new version of a source (by default, today's date)"""
+    if source not in SOURCES:
+        raise ValueError(f"Source must be one of {SOURCES}")
+
+    updates = _read_json(DATA_UPDATES_PATH)
+    updates[source] = version or datetime.date.today().isoformat()
+    _write_json(DATA_UPDATES_PATH, updates)
+
+
+def _outputs_exist(s: Step) -> bool:
+    return all(any(config.Paths.output.glob(output)) for output in s.outputs)
+
+
+def is_up_to_date(s: Step, lineage: dict, versions: dict) -> bool:
+    """Whether the outputs of a step were built from the current source versions"""
+    built_from = lineage.get(s.key)
+    if built_from is None or not _outputs_exist(s):
+        return False
+
+    return all(built_from.get(source) == versions[source] for source in s.sources)
+
+
+def read_lineage() -> dict:
+    return _read_json(LINEAGE_PATH)
+
+
+def record_lineage(steps: list[Step]) -> None:
+    """Store the source versions the steps were built from.
+
+    Versions are read after the steps ran, as a load may have downloaded new data.
+    """
+    versions = source_versions()
+    lineage = read_lineage()
+    for s in steps:
+        if s.outputs:
+            lineage[s.key] = {source: versions[source] for source in s.sources}
+    _write_json(LINEAGE_PATH, dict(sorted(lineage.items())))
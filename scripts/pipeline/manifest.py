@@ -0,0 +1,336 @@
+"""Declarative list of every output of the project and of the steps producing them.
+
+Each export is a `Step` with the files it writes (as paths or glob patterns,
+relative to `Paths.output`) and the shared loads it depends on. Loads are steps
+too: they fill the in-process and on-disk caches (WEO store, CRS cache, IDS
+cache) so every export that follows reads from them.
+
+Steps which call the same function with the same parameters are the same node in
+the graph, so a load shared by several exports is only run once.
+
+`sources` lists the upstream datasets a step reads (see `lineage.SOURCES`), so that
+an incremental run only rebuilds outputs whose sources have a new version.
+
+`memory_mb` is a rough estimate of the peak memory of a step, used by the runner to
+limit how many steps run in parallel.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from scripts import tools
+from scripts.dac_data import bilateral_oda, multilateral
+from scripts.dac_data.tools import get_crs_data
+from scripts.debt import data as debt
+from scripts.debt.ids import load_ids
+from scripts.drm import data as drm
+from scripts.weo import load_weo
+
+# Constant price DAC data is deflated with DAC1 based deflators, and debt and DRM
+# data with IMF deflators.
+DAC_AGGREGATES: tuple[str, ...] = ("DAC1", "DAC2A")
+CRS_SOURCES: tuple[str, ...] = ("CRS", "DAC1")
+IDS_SOURCES: tuple[str, ...] = ("IDS", "WEO")
+WEO_SOURCES: tuple[str, ...] = ("WEO",)
+
+# Loading several years of the CRS is by far the most memory intensive step
+CRS_MEMORY_MB: int = 6_000
+
+
+@dataclass(frozen=True, eq=False)
+class Step:
+    """A function call in the pipeline, with the outputs it writes"""
+
+    func: Callable
+    kwargs: dict[str, Any] = field(default_factory=dict)
+    outputs: tuple[str, ...] = ()
+    depends_on: tuple["Step", ...] = ()
+    default: bool = True
+    sources: tuple[str, ...] = ()
+    memory_mb: int = 1_000
+
+    @property
+    def key(self) -> str:
+        """Identifies the call. Steps with the same key are the same node."""
+        args = ", ".join(f"{k}={v!r}" for k, v in sorted(self.kwargs.items()))
+        return f"{self.func.__module__}.{self.func.__qualname__}({args})"
+
+    def run(self) -> Any:
+        return self.func(**self.kwargs)
+
+
+def step(
+    func: Callable,
+    *,
+    outputs: tuple[str, ...] = (),
+    depends_on: tuple[Step, ...] = (),
+    default: bool = True,
+    sources: tuple[str, ...] = (),
+    memory_mb: int = 1_000,
+    **kwargs,
+) -> Step:
+    return Step(
+        func=func,
+        kwargs=kwargs,
+        outputs=outputs,
+        depends_on=depends_on,
+        default=default,
+        sources=sources,
+        memory_mb=memory_mb,
+    )
+
+
+def _oda_steps() -> list[Step]:
+    crs_gross_disbursements = step(
+        get_crs_data,
+        donors=None,
+        start_year=2015,
+        end_year=2022,
+        oda_only=True,
+        prices="current",
+        exclude_china=False,
+        exclude_idrc=False,
+        exclude_students=False,
+        exclude_awareness=False,
+        include_modality=False,
+        memory_mb=CRS_MEMORY_MB,
+    )
+
+    return [
+        step(
+            bilateral_oda.export_all_donors_gross_disbursements,
+            sources=DAC_AGGREGATES,
+            exclude_china=True,
+            memory_mb=2_000,
+            outputs=(
+                "oda/total_gross_disbursements_constant_oda_excl_China.csv",
+                "oda/total_gross_disbursements_constant_oda_excl_China.parquet",
+                "oda/total_gross_disbursements_constant_oda_excl_China.json",
+                "oda/in_donor_constant_oda.csv",
+                "oda/in_donor_constant_oda.parquet",
+            ),
+        ),
+        step(
+            bilateral_oda.export_all_donors_gross_disbursements,
+            sources=DAC_AGGREGATES,
+            exclude_china=False,
+            memory_mb=2_000,
+            outputs=(
+                "oda/total_gross_disbursements_constant_oda.csv",
+                "oda/total_gross_disbursements_constant_oda.parquet",
+                "oda/total_gross_disbursements_constant_oda.json",
+                "oda/in_donor_constant_oda.csv",
+                "oda/in_donor_constant_oda.parquet",
+            ),
+        ),
+        step(
+            bilateral_oda.export_oecd_gross_disbursements_versions,
+            sources=CRS_SOURCES,
+            base_years=[None, 2015],
+            by_donor=True,
+            outputs=(
+                "oecd/oda_gross_disbursements_current_by_donor_2015_2022.csv",
+                "oecd/oda_gross_disbursements_current_by_donor_2015_2022.parquet",
+                "oecd/oda_gross_disbursements_2015constant_by_donor_2015_2022.csv",
+                "oecd/oda_gross_disbursements_2015constant_by_donor_2015_2022.parquet",
+            ),
+            depends_on=(crs_gross_disbursements,),
+        ),
+        step(
+            bilateral_oda.export_oecd_gross_disbursements_versions,
+            sources=CRS_SOURCES,
+            base_years=[None, 2015],
+            by_donor=False,
+            outputs=(
+                "oecd/oda_gross_disbursements_current_2015_2022.csv",
+                "oecd/oda_gross_disbursements_current_2015_2022.parquet",
+                "oecd/oda_gross_disbursements_2015constant_2015_2022.csv",
+                "oecd/oda_gross_disbursements_2015constant_2015_2022.parquet",
+            ),
+            depends_on=(crs_gross_disbursements,),
+        ),
+        step(
+            bilateral_oda.export_bilateral_commitments_versions,
+            sources=CRS_SOURCES,
+            outputs=(
+                "total_bilateral_commitments_oda_constant_excl_China.csv",
+                "total_bilateral_commitments_oda_constant_excl_China.parquet",
+                "total_key_stats_bilateral_commitments_oda.json",
+                "core_bilateral_commitments_oda_constant_excl_China.csv",
+                "core_bilateral_commitments_oda_constant_excl_China.parquet",
+                "core_key_stats_bilateral_commitments_oda.json",
+            ),
+            memory_mb=CRS_MEMORY_MB,
+            default=False,
+        ),
+        step(
+            bilateral_oda.export_oof_bilateral_versions,
+            sources=CRS_SOURCES,
+            outputs=(
+                "total_bilateral_non_concessional_constant_excl_China.csv",
+                "total_bilateral_non_concessional_constant_excl_China.parquet",
+                "total_key_stats_bilateral_non_concessional.json",
+                "core_bilateral_non_concessional_constant_excl_China.csv",
+                "core_bilateral_non_concessional_constant_excl_China.parquet",
+                "core_key_stats_bilateral_non_concessional.json",
+            ),
+            memory_mb=CRS_MEMORY_MB,
+            default=False,
+        ),
+        step(
+            bilateral_oda.export_multilateral,
+            sources=CRS_SOURCES,
+            outputs=(
+                "core_multilateral_commitments_oda.csv",
+                "core_multilateral_commitments_oda.parquet",
+                "key_stats_core_multilateral_commitments_oda.json",
+            ),
+            memory_mb=CRS_MEMORY_MB,
+            default=False,
+        ),
+        step(
+            multilateral.export_mdb_non_concessional,
+            sources=CRS_SOURCES,
+            outputs=(
+                "mdb_commitments_non_concessional_constant_excl_China.csv",
+                "mdb_commitments_non_concessional_constant_excl_China.parquet",
+                "mdb_stats_non_concessional.json",
+            ),
+            memory_mb=CRS_MEMORY_MB,
+        ),
+    ]
+
+
+def _debt_steps() -> list[Step]:
+    steps = [
+        step(
+            debt.export_bilateral,
+            sources=IDS_SOURCES,
+            outputs=(
+                "non_concessional_lending/non_concessional_bilateral.csv",
+                "non_concessional_lending/non_concessional_bilateral.parquet",
+                "non_concessional_lending/non_concessional_bilateral_excl_china.csv",
+                "non_concessional_lending/non_concessional_bilateral_excl_china.parquet",
+                "non_concessional_lending/non_concessional_bilateral.json",
+            ),
+            depends_on=(
+                step(
+                    load_ids,
+                    indicators=["DT.DIS.BLAT.CD", "DT.DIS.BLTC.CD"],
+                    start_year=2013,
+                    end_year=2022,
+                ),
+            ),
+        ),
+        step(
+            debt.export_multilateral,
+            sources=IDS_SOURCES,
+            outputs=(
+                "non_concessional_lending/non_concessional_multilateral.csv",
+                "non_concessional_lending/non_concessional_multilateral.parquet",
+                "non_concessional_lending/non_concessional_multilateral_excl_china.csv",
+                "non_concessional_lending/non_concessional_multilateral_excl_china.parquet",
+                "non_concessional_lending/non_concessional_multilateral.json",
+            ),
+            depends_on=(
+                step(
+                    load_ids,
+                    indicators=["DT.DIS.MLAT.CD", "DT.DIS.MLTC.CD"],
+                    start_year=2013,
+                    end_year=2022,
+                ),
+            ),
+        ),
+    ]
+
+    for indicator in [
+        "debt_service",
+        "bilateral_non_concessional_debt_disbursements",
+        "multilateral_non_concessional_debt_disbursements",
+    ]:
+        ids = step(
+            load_ids,
+            indicators=debt.debt_oecd_indicators(indicator),
+            start_year=2015,
+            end_year=2025,
+        )
+        steps.append(
+            step(
+                debt.export_oecd_versions,
+                sources=IDS_SOURCES,
+                indicator=indicator,
+                base_year=2015,
+                outputs=(f"oecd/{indicator}_*.csv", f"oecd/{indicator}_*.parquet"),
+                depends_on=(ids,),
+            )
+        )
+
+    return steps
+
+
+def _drm_steps() -> list[Step]:
+    weo = step(load_weo)
+
+    return [
+        step(
+            drm.export_drm_oecd_versions,
+            sources=WEO_SOURCES,
+            base_years=[None, 2015],
+            only_emde=True,
+            outputs=(
+                "oecd/domestic_revenues_current_emde.csv",
+                "oecd/domestic_revenues_current_emde.parquet",
+                "oecd/domestic_revenues_constant_2015_emde.csv",
+                "oecd/domestic_revenues_constant_2015_emde.parquet",
+            ),
+            depends_on=(weo,),
+        ),
+        step(
+            drm.export_drm_oecd_versions,
+            sources=WEO_SOURCES,
+            base_years=[None, 2015],
+            only_emde=False,
+            outputs=(
+                "oecd/domestic_revenues_current.csv",
+                "oecd/domestic_revenues_current.parquet",
+                "oecd/domestic_revenues_constant_2015.csv",
+                "oecd/domestic_revenues_constant_2015.parquet",
+            ),
+            depends_on=(weo,),
+        ),
+        step(
+            drm.export_drm_data,
+            sources=WEO_SOURCES,
+            exclude_china_data=False,
+            outputs=(
+                "drm/domestic_revenues_constant.csv",
+                "drm/domestic_revenues_constant.parquet",
+                "drm/stats_domestic_revenues_constant.json",
+            ),
+            depends_on=(weo,),
+            default=False,
+        ),
+        step(
+            drm.export_drm_data,
+            sources=WEO_SOURCES,
+            exclude_china_data=True,
+            outputs=(
+                "drm/domestic_revenues_constant_excl_China.csv",
+                "drm/domestic_revenues_constant_excl_China.parquet",
+                "drm/stats_domestic_revenues_constant_excl_China.json",
+            ),
+            depends_on=(weo,),
+            default=False,
+        ),
+        step(
+            tools.export_usd_deflator,
+            sources=WEO_SOURCES,
+            outputs=("usd_deflator.csv", "usd_deflator.parquet"),
+            depends_on=(weo,),
+        ),
+    ]
+
+
+def build_manifest() -> list[Step]:
+    """Every export step of the project"""
+    return _oda_steps() + _debt_steps() + _drm_steps()
@@ -0,0 +1,242 @@
+"""Run the export steps listed in the manifest, in dependency order.
+
+Usage:
+    python -m scripts.pipeline.runner                 # every default output
+    python -m scripts.pipeline.runner oecd/debt_service_current_2015_2025.csv
+    python -m scripts.pipeline.runner "oecd/domestic_revenues_*" --list
+    python -m scripts.pipeline.runner --jobs 4
+    python -m scripts.pipeline.runner --incremental
+
+With `--jobs`, independent groups of steps run in parallel processes. Steps which
+depend on each other, or write the same files, are kept in the same process so that
+they share its caches. A group is only started while the memory estimates of the
+running groups fit in the memory available.
+
+With `--incremental`, outputs built from the current version of all their sources
+are skipped (see `scripts.pipeline.lineage`).
+
+Every run writes a profiling report (time, peak memory and rows by stage) under
+`output/profiling` (see `scripts.profiling`).
+"""
+
+import argparse
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from fnmatch import fnmatch
+from graphlib import TopologicalSorter
+
+from scripts import profiling
+from scripts.logger import logger
+from scripts.pipeline.lineage import (
+    is_up_to_date,
+    read_lineage,
+    record_lineage,
+    source_versions,
+)
+from scripts.pipeline.manifest import Step, build_manifest
+
+# Share of the available memory which parallel jobs are allowed to use
+MEMORY_FRACTION: float = 0.8
+
+
+def _matches(step: Step, target: str) -> bool:
+    """Whether a target (an output path, a pattern or a step key) refers to a step"""
+    return target == step.key or any(
+        fnmatch(target, output) or fnmatch(output, target) for output in step.outputs
+    )
+
+
+def build_graph(steps: list[Step]) -> dict[str, Step]:
+    """Collect the steps and their dependencies, merging identical steps"""
+    nodes: dict[str, Step] = {}
+
+    def add(s: Step) -> None:
+        if s.key in nodes:
+            return
+        nodes[s.key] = s
+        for dependency in s.depends_on:
+            add(dependency)
+
+    for s in steps:
+        add(s)
+
+    return nodes
+
+
+def plan(targets: list[str] | None = None, incremental: bool = False) -> list[Step]:
+    """The steps needed for the targets, in the order they should run.
+
+    Without targets, every default step of the manifest is planned. When incremental,
+    steps whose outputs are up to date are left out, with the loads only they need.
+    """
+    manifest = build_manifest()
+
+    if targets:
+        selected = [s for s in manifest if any(_matches(s, t) for t in targets)]
+        unmatched = [t for t in targets if not any(_matches(s, t) for s in manifest)]
+        if unmatched:
+            raise ValueError(f"No step produces {unmatched}")
+    else:
+        selected = [s for s in manifest if s.default]
+
+    if incremental:
+        lineage, versions = read_lineage(), source_versions()
+        fresh = {s.key for s in selected if is_up_to_date(s, lineage, versions)}
+        for key in sorted(fresh):
+            logger.info(f"Up to date: {key}")
+        selected = [s for s in selected if s.key not in fresh]
+
+    nodes = build_graph(selected)
+
+    graph = {key: {d.key for d in s.depends_on} for key, s in nodes.items()}
+
+    return [nodes[key] for key in TopologicalSorter(graph).static_order()]
+
+
+def components(steps: list[Step]) -> list[list[Step]]:
+    """Split planned steps into groups which can run independently.
+
+    Steps are in the same group when one depends on the other or when they write a
+    common output. Each group keeps the order of the plan.
+    """
+    parent = {s.key: s.key for s in steps}
+
+    def find(key: str) -> str:
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    def union(a: str, b: str) -> None:
+        parent[find(a)] = find(b)
+
+    writers: dict[str, str] = {}
+    for s in steps:
+        for dependency in s.depends_on:
+            union(s.key, dependency.key)
+        for output in s.outputs:
+            union(s.key, writers.setdefault(output, s.key))
+
+    groups: dict[str, list[Step]] = {}
+    for s in steps:
+        groups.setdefault(find(s.key), []).append(s)
+
+    return list(groups.values())
+
+
+def available_memory_mb() -> int | None:
+    """Physical memory currently available, in MB. None if it can't be known."""
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 1024**2
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _group_memory(group: list[Step]) -> int:
+    return max(s.memory_mb for s in group)
+
+
+def _run_steps(steps: list[Step]) -> tuple[list[Step], list[dict]]:
+    """Run steps in a worker, returning them with the stages recorded"""
+    # Workers are reused, and forked workers inherit the records of the parent
+    profiling.reset()
+
+    for s in steps:
+        logger.info(f"Running {s.key}")
+        with profiling.stage(s.key):
+            s.run()
+
+    return steps, profiling.records()
+
+
+def _run_parallel(groups: list[list[Step]], jobs: int) -> None:
+    """Run groups in a process pool, largest first, within the memory budget"""
+    memory = available_memory_mb()
+    budget = memory * MEMORY_FRACTION if memory is not None else None
+
+    pending = sorted(groups, key=_group_memory, reverse=True)
+    running = {}
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for group in list(pending):
+                if len(running) >= jobs:
+                    break
+                needed = _group_memory(group)
+                # A group is always started when nothing else runs
+                if running and budget is not None:
+                    if sum(running.values()) + needed > budget:
+                        continue
+                pending.remove(group)
+                running[pool.submit(_run_steps, group)] = needed
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+                steps, records = future.result()
+                profiling.add_records(records)
+                record_lineage(steps)
+
+
+def run(
+    targets: list[str] | None = None, jobs: int = 1, incremental: bool = False
+) -> None:
+    """Run the steps needed for the targets, in up to `jobs` processes.
+
+    The source versions each step was built from are recorded once it succeeds.
+    """
+    steps = plan(targets, incremental=incremental)
+
+    try:
+        if jobs <= 1:
+            for i, s in enumerate(steps, start=1):
+                logger.info(f"[{i}/{len(steps)}] {s.key}")
+                with profiling.stage(s.key):
+                    s.run()
+                record_lineage([s])
+        else:
+            groups = components(steps)
+            logger.info(
+                f"Running {len(steps)} steps in {len(groups)} independent groups"
+            )
+            _run_parallel(groups, jobs=jobs)
+    finally:
+        if steps:
+            profiling.write_report()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        help="outputs (paths or patterns relative to output/) or step keys to build",
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="only print the planned steps"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes to run independent steps in",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="skip outputs built from the current version of their sources",
+    )
+    args = parser.parse_args()
+
+    if args.list:
+        for s in plan(args.targets, incremental=args.incremental):
+            print(s.key)
+            for output in s.outputs:
+                print(f"    -> {output}")
+        return
+
+    run(args.targets, jobs=args.jobs, incremental=args.incremental)
+
+
+if __name__ == "__main__":
+    main()
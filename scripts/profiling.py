@@ -0,0 +1,227 @@
+"""Timing and memory records for the stages of the pipeline.
+
+`stage` works as a decorator or as a context manager. Each use records the wall time,
+the resident memory before and after the stage, the highest resident memory reached
+during the stage and, when known, the number of rows going in and out.
+
+Memory is read from `/proc/self/status`, and the high-water mark is reset when a stage
+starts by writing to `/proc/self/clear_refs`. Where these are not available (macOS,
+Windows), the memory fields are left empty. Records are logged at DEBUG level and can be
+written to a report under `output/profiling` with `write_report`.
+
+    @stage("deflate")
+    def apply_deflator(df, ...): ...
+
+    with stage("group") as s:
+        df = df.groupby(...).sum()
+        s.rows = len(df)
+"""
+
+import datetime
+import json
+import time
+from functools import wraps
+from pathlib import Path
+
+import pandas as pd
+
+from scripts import config
+from scripts.logger import logger
+
+PROFILING_PATH: Path = config.Paths.output / "profiling"
+
+STATUS_PATH: Path = Path("/proc/self/status")
+CLEAR_REFS_PATH: Path = Path("/proc/self/clear_refs")
+
+_RECORDS: list[dict] = []
+_DEPTH: int = 0
+
+# Highest memory seen so far by each open stage, outside of the stages it contains
+_PEAKS: list[float | None] = []
+
+
+def _memory_mb() -> tuple[float | None, float | None]:
+    """Current and highest resident memory of the process, in MB"""
+    try:
+        status = STATUS_PATH.read_text()
+    except OSError:
+        return None, None
+
+    values = {}
+    for line in status.splitlines():
+        key, _, value = line.partition(":")
+        if key in ("VmRSS", "VmHWM"):
+            values[key] = int(value.split()[0]) / 1024
+
+    return values.get("VmRSS"), values.get("VmHWM")
+
+
+def _reset_peak() -> bool:
+    """Reset the highest resident memory of the process to its current value"""
+    try:
+        CLEAR_REFS_PATH.write_text("5")
+    except OSError:
+        return False
+
+    return True
+
+
+def _max(*values: float | None) -> float | None:
+    known = [v for v in values if v is not None]
+    return max(known) if known else None
+
+
+def _rows(obj) -> int | None:
+    """Number of rows of a frame, or of all the frames in a dict"""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return len(obj)
+
+    if isinstance(obj, dict) and obj:
+        if all(isinstance(v, pd.DataFrame) for v in obj.values()):
+            return sum(len(v) for v in obj.values())
+
+    return None
+
+
+class stage:
+    """Record the time, peak memory and rows of a stage of the pipeline"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows: int | None = None
+        self.rows_in: int | None = None
+
+    def __enter__(self) -> "stage":
+        global _DEPTH
+        self._depth = _DEPTH
+        _DEPTH += 1
+
+        # The high-water mark is shared by the process, so the enclosing stage keeps
+        # what it reached before it is reset for this one
+        self._rss_before, peak = _memory_mb()
+        if _PEAKS:
+            _PEAKS[-1] = _max(_PEAKS[-1], peak)
+        self._tracked = _reset_peak()
+        _PEAKS.append(None)
+
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        global _DEPTH
+        _DEPTH -= 1
+
+        seconds = time.perf_counter() - self._start
+        rss_after, peak = _memory_mb()
+        peak = _max(_PEAKS.pop(), peak) if self._tracked else None
+        if _PEAKS:
+            _PEAKS[-1] = _max(_PEAKS[-1], peak)
+
+        record = {
+            "stage": self.name,
+            "depth": self._depth,
+            "seconds": round(seconds, 4),
+            "rss_before_mb": self._rss_before,
+            "rss_after_mb": rss_after,
+            "peak_rss_mb": peak,
+            "rows_in": self.rows_in,
+            "rows": self.rows,
+            "failed": exc_type is not None,
+        }
+        _RECORDS.append(record)
+        logger.debug(
+            f"{self.name}: {record['seconds']}s, rows {self.rows_in} -> {self.rows}"
+        )
+
+        return False
+
+    def __call__(self, func):
+        """Decorate a function, counting the rows of its first frame argument and of
+        its result"""
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            # A new instance per call, so that nested or recursive calls don't clash
+            with stage(self.name) as s:
+                s.rows_in = next(
+                    (_rows(a) for a in args if isinstance(a, pd.DataFrame)), None
+                )
+                result = func(*args, **kwargs)
+                s.rows = _rows(result)
+            return result
+
+        return wrapper
+
+
+def records() -> list[dict]:
+    """The stages recorded in this process"""
+    return list(_RECORDS)
+
+
+def add_records(new: list[dict]) -> None:
+    """Add stages recorded in another process"""
+    _RECORDS.extend(new)
+
+
+def reset() -> None:
+    """Drop the recorded stages"""
+    _RECORDS.clear()
+
+
+def summary() -> pd.DataFrame:
+    """Calls, failures, total time, peak memory and rows by stage"""
+    df = pd.DataFrame(
+        _RECORDS,
+        columns=[
+            "stage",
+            "depth",
+            "seconds",
+            "rss_before_mb",
+            "rss_after_mb",
+            "peak_rss_mb",
+            "rows_in",
+            "rows",
+            "failed",
+        ],
+    ).astype({"rss_before_mb": float, "rss_after_mb": float, "peak_rss_mb": float})
+    df["rss_change_mb"] = df.rss_after_mb - df.rss_before_mb
+
+    return (
+        df.groupby("stage", as_index=False)
+        .agg(
+            calls=("seconds", "size"),
+            failed=("failed", "sum"),
+            seconds=("seconds", "sum"),
+            rss_change_mb=("rss_change_mb", "max"),
+            peak_rss_mb=("peak_rss_mb", "max"),
+            rows_in=("rows_in", lambda r: r.sum(min_count=1)),
+            rows=("rows", lambda r: r.sum(min_count=1)),
+        )
+        .sort_values("seconds", ascending=False)
+    )
+
+
+def write_report(name: str = "pipeline") -> Path:
+    """Write the recorded stages to a JSON report (with a summary by stage) and
+    to a CSV file, named after the run. Returns the path of the JSON report."""
+    PROFILING_PATH.mkdir(parents=True, exist_ok=True)
+
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = PROFILING_PATH / f"{name}_{timestamp}.json"
+
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "records": _RECORDS,
+                "summary": summary().to_dict(orient="records"),
+            },
+            f,
+            indent=4,
+            default=str,
+        )
+
+    pd.DataFrame(_RECORDS).to_csv(path.with_suffix(".csv"), index=False)
+
+    logger.info(f"Profiling report saved to {path}")
+
+    return path
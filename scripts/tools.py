@@ -2,26 +2,144 @@ import json
 from pathlib import Path
 
 import pandas as pd
-from bblocks import WorldEconomicOutlook, set_bblocks_data_path
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from scripts import config
+from scripts.profiling import stage
+from scripts.weo import get_weo
 
-set_bblocks_data_path(config.Paths.raw_data)
+# Fixed parquet types for the identifier columns shared by the outputs
+PARQUET_DTYPES: dict[str, str] = {
+    "year": "Int16",
+    "donor_code": "Int32",
+    "recipient_code": "Int32",
+}
 
 
+@stage("export_json")
 def export_json(path: Path, data: dict):
     """Export a dictionary to a JSON file"""
     with open(path, "w") as f:
         json.dump(data, f, indent=4)
 
 
-def get_usd_deflator() -> pd.DataFrame:
-    weo = WorldEconomicOutlook()
+def parquet_types(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast a table to the types used for parquet outputs.
+
+    Numeric identifiers get fixed integer types, values are stored as float64 and
+    text columns (names, ISO codes, indicators, etc.) are dictionary encoded.
+    """
+    df = df.copy()
+
+    for column in df.columns:
+        if column in PARQUET_DTYPES and pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = df[column].astype(PARQUET_DTYPES[column])
+        elif pd.api.types.is_float_dtype(df[column]):
+            df[column] = df[column].astype("float64")
+        elif pd.api.types.is_object_dtype(df[column]) or pd.api.types.is_string_dtype(
+            df[column]
+        ):
+            df[column] = df[column].astype("category")
+
+    return df
+
+
+@stage("export_table")
+def export_table(df: pd.DataFrame, path: Path) -> None:
+    """Export a table to CSV, and to parquet next to it with the same name"""
+    df.to_csv(path, index=False)
+    parquet_types(df).to_parquet(path.with_suffix(".parquet"), index=False)
+
+
+def _parquet_schema(table: pa.Table) -> pa.Schema:
+    """Schema of the first chunk, with dictionary indices wide enough for later
+    chunks with more categories. The pandas metadata is kept, so that the file reads
+    back with the types of `parquet_types`."""
+    return pa.schema(
+        [
+            (
+                pa.field(f.name, pa.dictionary(pa.int32(), f.type.value_type))
+                if pa.types.is_dictionary(f.type)
+                else f
+            )
+            for f in table.schema
+        ],
+        metadata=table.schema.metadata,
+    )
+
+
+class ExportSink:
+    """Export a table chunk by chunk, to CSV and to parquet next to it.
+
+    Chunks are appended to both files as they are written, so the full table is
+    never held in memory. Every chunk must have the columns of the first one.
+    The files are written to temporary paths, and only replace the outputs when the
+    sink is closed without an error.
 
-    weo.load_data(indicator=["NGDP_D"])
+        with ExportSink(path) as sink:
+            for year in years:
+                sink.write(get_year(year))
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.rows = 0
+        self._csv = path.with_suffix(".csv.tmp")
+        self._parquet = path.with_suffix(".parquet.tmp")
+        self._columns: list[str] | None = None
+        self._writer: pq.ParquetWriter | None = None
+        self._empty: pd.DataFrame | None = None
+
+    def __enter__(self) -> "ExportSink":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.close(publish=exc_type is None)
+        return False
+
+    @stage("export_chunk")
+    def write(self, df: pd.DataFrame) -> None:
+        """Append a chunk to the CSV and parquet files"""
+        if df.empty:
+            # Kept to write the headers if no chunk has any rows
+            self._empty = df
+            return
+
+        if self._writer is None:
+            self._columns = list(df.columns)
+            table = pa.Table.from_pandas(parquet_types(df), preserve_index=False)
+            self._writer = pq.ParquetWriter(self._parquet, _parquet_schema(table))
+            df.to_csv(self._csv, index=False)
+        else:
+            df = df[self._columns]
+            df.to_csv(self._csv, index=False, header=False, mode="a")
+
+        table = pa.Table.from_pandas(parquet_types(df), preserve_index=False)
+        self._writer.write_table(table.cast(self._writer.schema))
+        self.rows += len(df)
+
+    def close(self, publish: bool = True) -> None:
+        """Close the files and move them to the output paths, or drop them if
+        `publish` is False"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+            if publish:
+                self._csv.replace(self.path)
+                self._parquet.replace(self.path.with_suffix(".parquet"))
+            else:
+                self._csv.unlink(missing_ok=True)
+                self._parquet.unlink(missing_ok=True)
+
+        elif self._empty is not None and publish:
+            export_table(self._empty, self.path)
+
+
+def get_usd_deflator() -> pd.DataFrame:
     data = (
-        weo.get_data()
-        .assign(year=lambda d: d.year.dt.year)
+        get_weo("NGDP_D")
         .rename(columns={"value": "deflator"})
         .loc[lambda d: d.year.between(2019, 2024)]
         .loc[lambda d: d.iso_code == "USA"]
@@ -34,6 +152,6 @@ def get_usd_deflator() -> pd.DataFrame:
     return data
 
 
-if __name__ == "__main__":
+def export_usd_deflator() -> None:
     deflator = get_usd_deflator()
-    deflator.to_csv(config.Paths.output / "usd_deflator.csv", index=False)
+    export_table(deflator, config.Paths.output / "usd_deflator.csv")
@@ -0,0 +1,47 @@
+"""Shared store for the IMF World Economic Outlook (WEO) data.
+
+Every indicator used by the project is loaded once per process, in a single read,
+and kept as a tidy frame with the year as an integer. DRM and deflator callers
+take the indicators they need from it.
+"""
+
+from functools import cache
+
+import pandas as pd
+from bblocks import WorldEconomicOutlook, set_bblocks_data_path
+
+from scripts import config
+from scripts.profiling import stage
+from scripts.schema import to_categorical
+
+set_bblocks_data_path(config.Paths.raw_data)
+
+WEO_INDICATORS: list[str] = ["GGR_NGDP", "GGX_NGDP", "NGDPD", "NGDP_D"]
+
+
+@cache
+@stage("load_weo")
+def load_weo() -> pd.DataFrame:
+    """All the WEO indicators used by the project, with their metadata"""
+    weo = WorldEconomicOutlook(year=config.WEO_YEAR, release=config.WEO_RELEASE)
+    weo.load_data(indicator=WEO_INDICATORS)
+
+    return (
+        weo.get_data(keep_metadata=True)
+        .assign(year=lambda d: d.year.dt.year)
+        .pipe(to_categorical)
+        .reset_index(drop=True)
+    )
+
+
+def get_weo(indicators: str | list[str], keep_metadata: bool = False) -> pd.DataFrame:
+    """Get one or more WEO indicators from the shared store"""
+    if isinstance(indicators, str):
+        indicators = [indicators]
+
+    data = load_weo().loc[lambda d: d.indicator.isin(indicators)]
+
+    if not keep_metadata:
+        data = data.filter(["iso_code", "name", "indicator", "year", "value"])
+
+    return data.reset_index(drop=True)